@@ -0,0 +1,33 @@
+"""Add selector to password reset tokens
+
+Revision ID: 0e5b7d2c9f13
+Revises: d3a9f6c1e2b4
+Create Date: 2026-10-18 15:46:12.391054
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0e5b7d2c9f13'
+down_revision: Union[str, Sequence[str], None] = 'd3a9f6c1e2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('password_reset_selector', sa.String(), nullable=True))
+    op.create_index(op.f('ix_users_password_reset_selector'), 'users', ['password_reset_selector'], unique=True)
+    # Pending tokens were argon2 hashes of the whole token and cannot be looked up; users request a new one
+    op.execute("UPDATE users SET password_reset_token = NULL, password_reset_expires = NULL WHERE password_reset_token IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE users SET password_reset_token = NULL, password_reset_expires = NULL WHERE password_reset_token IS NOT NULL")
+    op.drop_index(op.f('ix_users_password_reset_selector'), table_name='users')
+    op.drop_column('users', 'password_reset_selector')
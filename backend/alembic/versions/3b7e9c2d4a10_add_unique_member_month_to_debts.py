@@ -0,0 +1,31 @@
+"""Add unique (member_id, month) constraint to debts
+
+Revision ID: 3b7e9c2d4a10
+Revises: 55084a92284a
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e9c2d4a10'
+down_revision: Union[str, Sequence[str], None] = '55084a92284a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Monthly debt generation inserts with ON CONFLICT (member_id, month) DO NOTHING.
+    # If this fails, there are duplicated debts for the same member and month that must be merged first:
+    #   SELECT member_id, month, COUNT(*) FROM debts GROUP BY member_id, month HAVING COUNT(*) > 1;
+    op.create_unique_constraint('uq_debts_member_id_month', 'debts', ['member_id', 'month'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_debts_member_id_month', 'debts', type_='unique')
@@ -0,0 +1,34 @@
+"""Add per-club data versions
+
+Revision ID: 4f8c1a7e3d25
+Revises: 0e5b7d2c9f13
+Create Date: 2026-10-18 16:14:38.527910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f8c1a7e3d25'
+down_revision: Union[str, Sequence[str], None] = '0e5b7d2c9f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('club_data_versions',
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=20), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ),
+    sa.PrimaryKeyConstraint('club_id', 'scope')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('club_data_versions')
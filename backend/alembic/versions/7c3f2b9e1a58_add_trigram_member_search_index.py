@@ -0,0 +1,44 @@
+"""Add accent-insensitive trigram index for member search
+
+Revision ID: 7c3f2b9e1a58
+Revises: b5e0c8a1d263
+Create Date: 2026-10-18 14:52:33.204716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3f2b9e1a58'
+down_revision: Union[str, Sequence[str], None] = 'b5e0c8a1d263'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    # unaccent() is only STABLE, so it cannot be used in an index; this wrapper pins the dictionary
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+        $$ SELECT public.unaccent('public.unaccent', $1) $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """)
+
+    # Must match backend/member_search.py:member_search_expression
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_members_search_trgm ON members
+            USING gin (f_unaccent(lower(first_name || ' ' || last_name || ' ' || coalesce(dni, '') || ' ' || coalesce(member_number, ''))) gin_trgm_ops)
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_members_search_trgm")
+    op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
@@ -0,0 +1,114 @@
+"""Add club_monthly_summary rollup maintained by triggers
+
+Revision ID: 8d21f5c7b3e6
+Revises: 3b7e9c2d4a10
+Create Date: 2026-10-18 11:02:17.540963
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d21f5c7b3e6'
+down_revision: Union[str, Sequence[str], None] = '3b7e9c2d4a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Statement-level triggers: a bulk insert of N transactions costs one aggregated upsert, not N.
+SUMMARY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION club_monthly_summary_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE club_monthly_summary s
+        SET total_amount = s.total_amount - d.total_amount,
+            transaction_count = s.transaction_count - d.transaction_count
+        FROM (
+            SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE) AS month, type, category_id,
+                   activity_id, payment_method, SUM(amount) AS total_amount, COUNT(*) AS transaction_count
+            FROM old_rows
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ) d
+        WHERE s.club_id = d.club_id
+          AND s.month = d.month
+          AND s.type = d.type
+          AND s.category_id IS NOT DISTINCT FROM d.category_id
+          AND s.activity_id IS NOT DISTINCT FROM d.activity_id
+          AND s.payment_method IS NOT DISTINCT FROM d.payment_method;
+
+        DELETE FROM club_monthly_summary WHERE transaction_count <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO club_monthly_summary (club_id, month, type, category_id, activity_id, payment_method, total_amount, transaction_count)
+        SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE), type, category_id, activity_id, payment_method,
+               SUM(amount), COUNT(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4, 5, 6
+        ON CONFLICT ON CONSTRAINT uq_club_monthly_summary_key DO UPDATE
+        SET total_amount = club_monthly_summary.total_amount + EXCLUDED.total_amount,
+            transaction_count = club_monthly_summary.transaction_count + EXCLUDED.transaction_count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('club_monthly_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('type', sa.Enum('income', 'expense', name='category_type_enum', native_enum=False), nullable=False),
+    sa.Column('payment_method', sa.String(), nullable=True),
+    sa.Column('total_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('activity_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], ),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('club_id', 'month', 'type', 'category_id', 'activity_id', 'payment_method', name='uq_club_monthly_summary_key', postgresql_nulls_not_distinct=True)
+    )
+
+    op.execute(SUMMARY_TRIGGER_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER club_transactions_summary_insert AFTER INSERT ON club_transactions
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION club_monthly_summary_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER club_transactions_summary_update AFTER UPDATE ON club_transactions
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION club_monthly_summary_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER club_transactions_summary_delete AFTER DELETE ON club_transactions
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION club_monthly_summary_apply()
+    """)
+
+    # Backfill the existing history
+    op.execute("""
+        INSERT INTO club_monthly_summary (club_id, month, type, category_id, activity_id, payment_method, total_amount, transaction_count)
+        SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE), type, category_id, activity_id, payment_method,
+               SUM(amount), COUNT(*)
+        FROM club_transactions
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS club_transactions_summary_delete ON club_transactions")
+    op.execute("DROP TRIGGER IF EXISTS club_transactions_summary_update ON club_transactions")
+    op.execute("DROP TRIGGER IF EXISTS club_transactions_summary_insert ON club_transactions")
+    op.execute("DROP FUNCTION IF EXISTS club_monthly_summary_apply()")
+    op.drop_table('club_monthly_summary')
@@ -0,0 +1,118 @@
+"""Scope the monthly summary trigger cleanup and rebuild lock to the clubs it touches
+
+Revision ID: a3c9e5f7b1d4
+Revises: f5a1d8c3e7b2
+Create Date: 2026-10-18 18:47:12.206553
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9e5f7b1d4'
+down_revision: Union[str, Sequence[str], None] = 'f5a1d8c3e7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Writers take a shared advisory lock per club they touch before changing the summary, so that
+# rebuilding one club (backend/summary.py) only needs the exclusive lock of that club. Emptied
+# summary rows are deleted only for the (club, month) keys of the statement.
+SUMMARY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION club_monthly_summary_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('club_monthly_summary'), club_id)
+        FROM (SELECT DISTINCT club_id FROM old_rows ORDER BY club_id) c;
+
+        UPDATE club_monthly_summary s
+        SET total_amount = s.total_amount - d.total_amount,
+            transaction_count = s.transaction_count - d.transaction_count
+        FROM (
+            SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE) AS month, type, category_id,
+                   activity_id, payment_method, SUM(amount) AS total_amount, COUNT(*) AS transaction_count
+            FROM old_rows
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ) d
+        WHERE s.club_id = d.club_id
+          AND s.month = d.month
+          AND s.type = d.type
+          AND s.category_id IS NOT DISTINCT FROM d.category_id
+          AND s.activity_id IS NOT DISTINCT FROM d.activity_id
+          AND s.payment_method IS NOT DISTINCT FROM d.payment_method;
+
+        DELETE FROM club_monthly_summary s
+        USING (SELECT DISTINCT club_id, CAST(date_trunc('month', transaction_date) AS DATE) AS month FROM old_rows) k
+        WHERE s.club_id = k.club_id AND s.month = k.month AND s.transaction_count <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('club_monthly_summary'), club_id)
+        FROM (SELECT DISTINCT club_id FROM new_rows ORDER BY club_id) c;
+
+        INSERT INTO club_monthly_summary (club_id, month, type, category_id, activity_id, payment_method, total_amount, transaction_count)
+        SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE), type, category_id, activity_id, payment_method,
+               SUM(amount), COUNT(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4, 5, 6
+        ON CONFLICT ON CONSTRAINT uq_club_monthly_summary_key DO UPDATE
+        SET total_amount = club_monthly_summary.total_amount + EXCLUDED.total_amount,
+            transaction_count = club_monthly_summary.transaction_count + EXCLUDED.transaction_count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+PREVIOUS_SUMMARY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION club_monthly_summary_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE club_monthly_summary s
+        SET total_amount = s.total_amount - d.total_amount,
+            transaction_count = s.transaction_count - d.transaction_count
+        FROM (
+            SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE) AS month, type, category_id,
+                   activity_id, payment_method, SUM(amount) AS total_amount, COUNT(*) AS transaction_count
+            FROM old_rows
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ) d
+        WHERE s.club_id = d.club_id
+          AND s.month = d.month
+          AND s.type = d.type
+          AND s.category_id IS NOT DISTINCT FROM d.category_id
+          AND s.activity_id IS NOT DISTINCT FROM d.activity_id
+          AND s.payment_method IS NOT DISTINCT FROM d.payment_method;
+
+        DELETE FROM club_monthly_summary WHERE transaction_count <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO club_monthly_summary (club_id, month, type, category_id, activity_id, payment_method, total_amount, transaction_count)
+        SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE), type, category_id, activity_id, payment_method,
+               SUM(amount), COUNT(*)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4, 5, 6
+        ON CONFLICT ON CONSTRAINT uq_club_monthly_summary_key DO UPDATE
+        SET total_amount = club_monthly_summary.total_amount + EXCLUDED.total_amount,
+            transaction_count = club_monthly_summary.transaction_count + EXCLUDED.transaction_count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(SUMMARY_TRIGGER_FUNCTION)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(PREVIOUS_SUMMARY_TRIGGER_FUNCTION)
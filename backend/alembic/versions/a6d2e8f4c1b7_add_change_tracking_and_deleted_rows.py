@@ -0,0 +1,102 @@
+"""Add created_at/updated_at to club data and deleted_rows tombstones
+
+Revision ID: a6d2e8f4c1b7
+Revises: 4f8c1a7e3d25
+Create Date: 2026-10-18 16:21:07.318246
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e8f4c1b7'
+down_revision: Union[str, Sequence[str], None] = '4f8c1a7e3d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CHANGE_TRACKED_TABLES = ['activities', 'members', 'categories', 'club_transactions', 'debts', 'debt_items', 'payments']
+
+# Row-level, so raw SQL updates (payments, balances repair) are tracked as well as ORM ones.
+TOUCH_UPDATED_AT_FUNCTION = """
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Statement-level: a bulk delete of N rows writes its N tombstones with a single insert.
+# The club of debts, debt items and payments is resolved through their member, so children
+# must be deleted before their parents (as every delete path does).
+RECORD_DELETED_ROWS_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_deleted_rows() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'debts' THEN
+        INSERT INTO deleted_rows (table_name, row_id, club_id)
+        SELECT TG_TABLE_NAME, o.id, m.club_id
+        FROM old_rows o
+        LEFT JOIN members m ON m.id = o.member_id;
+    ELSIF TG_TABLE_NAME IN ('debt_items', 'payments') THEN
+        INSERT INTO deleted_rows (table_name, row_id, club_id)
+        SELECT TG_TABLE_NAME, o.id, m.club_id
+        FROM old_rows o
+        LEFT JOIN debts d ON d.id = o.debt_id
+        LEFT JOIN members m ON m.id = d.member_id;
+    ELSE
+        INSERT INTO deleted_rows (table_name, row_id, club_id)
+        SELECT TG_TABLE_NAME, o.id, o.club_id
+        FROM old_rows o;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('deleted_rows',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('club_id', sa.Integer(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deleted_rows_club_id_deleted_at', 'deleted_rows', ['club_id', 'deleted_at'], unique=False)
+
+    op.execute(TOUCH_UPDATED_AT_FUNCTION)
+    op.execute(RECORD_DELETED_ROWS_FUNCTION)
+    for table in CHANGE_TRACKED_TABLES:
+        # now() is stable: existing rows get the migration time without a table rewrite
+        op.add_column(table, sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+        op.execute(f"""
+            CREATE TRIGGER {table}_touch_updated_at BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_record_deleted_rows AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION record_deleted_rows()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in CHANGE_TRACKED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_record_deleted_rows ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_touch_updated_at ON {table}")
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'created_at')
+    op.execute("DROP FUNCTION IF EXISTS record_deleted_rows()")
+    op.execute("DROP FUNCTION IF EXISTS touch_updated_at()")
+    op.drop_index('ix_deleted_rows_club_id_deleted_at', table_name='deleted_rows')
+    op.drop_table('deleted_rows')
@@ -0,0 +1,53 @@
+"""Add composite and partial indexes for the hot query shapes
+
+Revision ID: a92c6d4e7f31
+Revises: f1d7a3c58e04
+Create Date: 2026-10-18 13:41:26.118052
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a92c6d4e7f31'
+down_revision: Union[str, Sequence[str], None] = 'f1d7a3c58e04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns, partial index predicate)
+# debts(member_id, month) is already served by the uq_debts_member_id_month unique constraint.
+INDEXES = [
+    ('ix_members_club_id_is_active_last_name', 'members', ['club_id', 'is_active', 'last_name'], None),
+    ('ix_members_active_club_id_dni', 'members', ['club_id', 'dni'], 'is_active = true'),
+    ('ix_debts_unpaid_member_id_month', 'debts', ['member_id', 'month'], 'is_paid = false'),
+    ('ix_club_transactions_club_id_transaction_date', 'club_transactions', ['club_id', 'transaction_date'], None),
+    ('ix_club_transactions_club_id_type_payment_method', 'club_transactions', ['club_id', 'type', 'payment_method'], None),
+    ('ix_club_transactions_category_id', 'club_transactions', ['category_id'], None),
+    ('ix_payments_debt_id', 'payments', ['debt_id'], None),
+    ('ix_debt_items_debt_id', 'debt_items', ['debt_id'], None),
+    ('ix_member_activity_activity_id', 'member_activity', ['activity_id'], None),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY does not lock writes, so this can run against a live database,
+    # but it cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False, if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
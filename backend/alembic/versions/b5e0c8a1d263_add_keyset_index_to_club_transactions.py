@@ -0,0 +1,39 @@
+"""Add (club_id, transaction_date, id) keyset index to club_transactions
+
+Revision ID: b5e0c8a1d263
+Revises: a92c6d4e7f31
+Create Date: 2026-10-18 14:17:09.835571
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e0c8a1d263'
+down_revision: Union[str, Sequence[str], None] = 'a92c6d4e7f31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The new index covers (club_id, transaction_date) too, so the old one is dropped
+    with op.get_context().autocommit_block():
+        op.create_index('ix_club_transactions_club_id_transaction_date_id', 'club_transactions',
+                        ['club_id', 'transaction_date', 'id'], unique=False, if_not_exists=True,
+                        postgresql_concurrently=True)
+        op.drop_index('ix_club_transactions_club_id_transaction_date', table_name='club_transactions',
+                      if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_club_transactions_club_id_transaction_date', 'club_transactions',
+                        ['club_id', 'transaction_date'], unique=False, if_not_exists=True,
+                        postgresql_concurrently=True)
+        op.drop_index('ix_club_transactions_club_id_transaction_date_id', table_name='club_transactions',
+                      if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,60 @@
+"""Add persisted member balances
+
+Revision ID: c4a8e1f09b52
+Revises: 8d21f5c7b3e6
+Create Date: 2026-10-18 11:48:05.172390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e1f09b52'
+down_revision: Union[str, Sequence[str], None] = '8d21f5c7b3e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('member_balances',
+    sa.Column('member_id', sa.Integer(), nullable=False),
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('total_billed', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('total_paid', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('outstanding', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('oldest_unpaid_month', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ),
+    sa.ForeignKeyConstraint(['member_id'], ['members.id'], ),
+    sa.PrimaryKeyConstraint('member_id')
+    )
+    op.create_index('ix_member_balances_club_id_with_debt', 'member_balances', ['club_id'], unique=False, postgresql_where=sa.text('outstanding > 0'))
+
+    # Backfill from the existing debts and payments
+    op.execute("""
+        INSERT INTO member_balances (member_id, club_id, total_billed, total_paid, outstanding, oldest_unpaid_month)
+        SELECT m.id, m.club_id, COALESCE(d.total_billed, 0), COALESCE(p.total_paid, 0),
+               COALESCE(d.total_billed, 0) - COALESCE(p.total_paid, 0), d.oldest_unpaid_month
+        FROM members m
+        LEFT JOIN (
+            SELECT member_id, SUM(total_amount) AS total_billed, MIN(month) FILTER (WHERE is_paid = false) AS oldest_unpaid_month
+            FROM debts
+            GROUP BY member_id
+        ) d ON d.member_id = m.id
+        LEFT JOIN (
+            SELECT debts.member_id, SUM(payments.amount) AS total_paid
+            FROM payments
+            JOIN debts ON debts.id = payments.debt_id
+            GROUP BY debts.member_id
+        ) p ON p.member_id = m.id
+        WHERE m.club_id IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_member_balances_club_id_with_debt', table_name='member_balances', postgresql_where=sa.text('outstanding > 0'))
+    op.drop_table('member_balances')
@@ -0,0 +1,110 @@
+"""Add change_seq to change-tracked tables and tombstones for delta sync
+
+Revision ID: c8e4b1f6a2d9
+Revises: a6d2e8f4c1b7
+Create Date: 2026-10-18 16:27:44.902615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e4b1f6a2d9'
+down_revision: Union[str, Sequence[str], None] = 'a6d2e8f4c1b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CHANGE_TRACKED_TABLES = ['activities', 'members', 'categories', 'club_transactions', 'debts', 'debt_items', 'payments']
+
+CURRENT_XACT_ID = "CAST(CAST(pg_current_xact_id() AS TEXT) AS BIGINT)"
+
+# Replaces touch_updated_at(): also stamps inserts and updates with the writing transaction's id.
+TRACK_ROW_CHANGE_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION track_row_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        NEW.updated_at := now();
+    END IF;
+    NEW.change_seq := {CURRENT_XACT_ID};
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TOUCH_UPDATED_AT_FUNCTION = """
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Enrolling or unenrolling a member changes what schemas.Member returns: touch the member.
+TOUCH_ENROLLED_MEMBERS_FUNCTION = """
+CREATE OR REPLACE FUNCTION touch_enrolled_members() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE members SET updated_at = now() WHERE id IN (SELECT member_id FROM new_rows);
+    ELSE
+        UPDATE members SET updated_at = now() WHERE id IN (SELECT member_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(TRACK_ROW_CHANGE_FUNCTION)
+    for table in CHANGE_TRACKED_TABLES:
+        # Existing rows predate every sync cursor: 0 keeps the column add free of a table rewrite
+        op.add_column(table, sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+        op.create_index(op.f(f'ix_{table}_change_seq'), table, ['change_seq'], unique=False)
+        op.execute(f"DROP TRIGGER {table}_touch_updated_at ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER {table}_track_row_change BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION track_row_change()
+        """)
+    op.execute("DROP FUNCTION touch_updated_at()")
+
+    op.add_column('deleted_rows', sa.Column('change_seq', sa.BigInteger(), server_default=sa.text(CURRENT_XACT_ID), nullable=False))
+    op.create_index('ix_deleted_rows_club_id_change_seq', 'deleted_rows', ['club_id', 'change_seq'], unique=False)
+
+    op.execute(TOUCH_ENROLLED_MEMBERS_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER member_activity_touch_members_insert AFTER INSERT ON member_activity
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION touch_enrolled_members()
+    """)
+    op.execute("""
+        CREATE TRIGGER member_activity_touch_members_delete AFTER DELETE ON member_activity
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION touch_enrolled_members()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS member_activity_touch_members_delete ON member_activity")
+    op.execute("DROP TRIGGER IF EXISTS member_activity_touch_members_insert ON member_activity")
+    op.execute("DROP FUNCTION IF EXISTS touch_enrolled_members()")
+
+    op.drop_index('ix_deleted_rows_club_id_change_seq', table_name='deleted_rows')
+    op.drop_column('deleted_rows', 'change_seq')
+
+    op.execute(TOUCH_UPDATED_AT_FUNCTION)
+    for table in CHANGE_TRACKED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_track_row_change ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER {table}_touch_updated_at BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+        """)
+        op.drop_index(op.f(f'ix_{table}_change_seq'), table_name=table)
+        op.drop_column(table, 'change_seq')
+    op.execute("DROP FUNCTION IF EXISTS track_row_change()")
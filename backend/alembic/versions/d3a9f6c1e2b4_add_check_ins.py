@@ -0,0 +1,47 @@
+"""Add check-in log
+
+Revision ID: d3a9f6c1e2b4
+Revises: 7c3f2b9e1a58
+Create Date: 2026-10-18 15:21:47.608132
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a9f6c1e2b4'
+down_revision: Union[str, Sequence[str], None] = '7c3f2b9e1a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('check_ins',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('checked_in_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('code', sa.String(), nullable=False),
+    sa.Column('allowed', sa.Boolean(), nullable=False),
+    sa.Column('reason', sa.String(length=20), nullable=False),
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=True),
+    sa.Column('activity_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], ),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ),
+    sa.ForeignKeyConstraint(['member_id'], ['members.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_check_ins_club_id_checked_in_at', 'check_ins', ['club_id', 'checked_in_at'], unique=False)
+    op.create_index(op.f('ix_check_ins_member_id'), 'check_ins', ['member_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_check_ins_member_id'), table_name='check_ins')
+    op.drop_index('ix_check_ins_club_id_checked_in_at', table_name='check_ins')
+    op.drop_table('check_ins')
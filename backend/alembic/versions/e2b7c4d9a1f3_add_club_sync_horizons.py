@@ -0,0 +1,32 @@
+"""Add club_sync_horizons for pruned tombstones
+
+Revision ID: e2b7c4d9a1f3
+Revises: c8e4b1f6a2d9
+Create Date: 2026-10-18 18:02:51.114027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7c4d9a1f3'
+down_revision: Union[str, Sequence[str], None] = 'c8e4b1f6a2d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('club_sync_horizons',
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('pruned_change_seq', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('club_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('club_sync_horizons')
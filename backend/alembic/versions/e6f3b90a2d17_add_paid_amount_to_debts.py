@@ -0,0 +1,36 @@
+"""Add paid_amount to debts
+
+Revision ID: e6f3b90a2d17
+Revises: c4a8e1f09b52
+Create Date: 2026-10-18 12:20:44.903127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f3b90a2d17'
+down_revision: Union[str, Sequence[str], None] = 'c4a8e1f09b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('debts', sa.Column('paid_amount', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    # Backfill from the existing payments
+    op.execute("""
+        UPDATE debts d
+        SET paid_amount = p.total_paid
+        FROM (SELECT debt_id, SUM(amount) AS total_paid FROM payments GROUP BY debt_id) p
+        WHERE d.id = p.debt_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('debts', 'paid_amount')
@@ -0,0 +1,30 @@
+"""Add tokens_valid_after to users
+
+Revision ID: f5a1d8c3e7b2
+Revises: e2b7c4d9a1f3
+Create Date: 2026-10-18 18:21:36.480215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a1d8c3e7b2'
+down_revision: Union[str, Sequence[str], None] = 'e2b7c4d9a1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('tokens_valid_after', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_users_tokens_valid_after'), 'users', ['tokens_valid_after'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_tokens_valid_after'), table_name='users')
+    op.drop_column('users', 'tokens_valid_after')
@@ -0,0 +1,307 @@
+"""
+Club backups: one CSV per table, zipped, streamed to the client as it is produced.
+backend/restore.py loads them back.
+
+Rows are read through server-side cursors (`yield_per`) and written straight into a zip
+archive whose output is drained after every batch, so memory stays bounded whatever the size
+of the club, nothing touches the disk, and the first bytes go out as soon as the first batch
+is read.
+
+On PostgreSQL the tables are read in parallel, by BACKUP_WORKERS threads with a connection
+each, taken from a dedicated pool (backup_engine) so that backups never starve the API's; at
+most BACKUP_CONCURRENCY backups run at once, further requests get a 503. A coordinator
+transaction opens a REPEATABLE READ snapshot and exports it with pg_export_snapshot(); every
+worker imports it (SET TRANSACTION SNAPSHOT), so the archive is point-in-time consistent
+across tables even while payments keep coming in. Workers hand their CSV batches to the
+response through bounded queues (BACKUP_PREFETCH_BATCHES each): the archive is written table
+after table, while the next tables are already being read.
+
+Incremental backups (`since`) only hold the rows of ChangeTracked tables updated since then,
+plus deleted_rows.csv with the tombstones of the rows deleted since then; users and
+enrollments have no change tracking and are always exported whole. Every archive ends with a
+manifest.json whose `next_since` is the `since` of the next incremental backup.
+"""
+import csv
+import enum
+import io
+import json
+import os
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import Table, create_engine, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+from .database import SQLALCHEMY_DATABASE_URL, engine
+
+BACKUP_BATCH_ROWS = int(os.getenv("BACKUP_BATCH_ROWS", 5000))
+# Tables read in parallel by one backup, each worker with its own connection
+BACKUP_WORKERS = int(os.getenv("BACKUP_WORKERS", 4))
+# CSV batches a worker may read ahead of the response, per table
+BACKUP_PREFETCH_BATCHES = int(os.getenv("BACKUP_PREFETCH_BATCHES", 4))
+# Backups running at once; others wait up to BACKUP_WAIT_SECONDS for a slot, then get a 503
+BACKUP_CONCURRENCY = int(os.getenv("BACKUP_CONCURRENCY", 1))
+BACKUP_WAIT_SECONDS = float(os.getenv("BACKUP_WAIT_SECONDS", 1))
+# Longest wait for the next batch of a table before the backup is aborted
+BACKUP_READ_TIMEOUT_SECONDS = float(os.getenv("BACKUP_READ_TIMEOUT_SECONDS", 300))
+
+# Each running backup holds a connection per worker plus the coordinator's, all from this pool
+if engine.dialect.name == "postgresql":
+    backup_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, pool_size=(BACKUP_WORKERS + 1) * BACKUP_CONCURRENCY, max_overflow=0
+    )
+else:
+    backup_engine = engine
+BackupSession = sessionmaker(autocommit=False, autoflush=False, bind=backup_engine)
+backup_slots = threading.BoundedSemaphore(BACKUP_CONCURRENCY)
+
+# Oldest start among the transactions in progress, or now. Rows they write carry an
+# updated_at/deleted_at at or after it (now() is their start time) even if they commit after
+# the backup's snapshot, so the next incremental backup starting there cannot miss them.
+CHANGE_WATERMARK_SQL = text("""
+SELECT LEAST(clock_timestamp(), MIN(xact_start))
+FROM pg_stat_activity
+WHERE datname = current_database() AND pid <> pg_backend_pid()
+""")
+
+# Tables that make up a club's backup, referenced tables first. Balances and the monthly
+# summary are derived data, rebuilt on restore.
+BACKUP_TABLES: List[Table] = [
+    models.User.__table__,
+    models.Activity.__table__,
+    models.Member.__table__,
+    models.member_activity_association,
+    models.Category.__table__,
+    models.ClubTransaction.__table__,
+    models.Debt.__table__,
+    models.DebtItem.__table__,
+    models.Payment.__table__
+]
+
+
+def backup_tables(since: Optional[datetime] = None) -> List[Table]:
+    return BACKUP_TABLES + [models.DeletedRow.__table__] if since is not None else BACKUP_TABLES
+
+
+def club_rows_query(table: Table, club_id: int, since: Optional[datetime] = None):
+    """
+    Every column of the table's rows that belong to the club, in primary key order; only
+    those changed (or deleted, for deleted_rows) at or after `since` if given.
+    """
+    query = select(table)
+    member_ids = select(models.Member.id).where(models.Member.club_id == club_id)
+    if "club_id" in table.c:
+        query = query.where(table.c.club_id == club_id)
+    elif "member_id" in table.c: # debts, member_activity
+        query = query.where(table.c.member_id.in_(member_ids))
+    else: # debt_items, payments
+        debt_ids = select(models.Debt.id).where(models.Debt.member_id.in_(member_ids))
+        query = query.where(table.c.debt_id.in_(debt_ids))
+    changed_at = table.c.get("updated_at", table.c.get("deleted_at"))
+    if since is not None and changed_at is not None:
+        query = query.where(changed_at >= since)
+    return query.order_by(*table.primary_key.columns)
+
+
+def csv_value(value):
+    """Enums are written as stored in the database; None becomes an empty field."""
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def iter_table_csv(db: Session, table: Table, club_id: int, since: Optional[datetime] = None) -> Iterator[bytes]:
+    """Yields the club's rows of `table` as UTF-8 CSV, one chunk per batch, the header first. Nothing for empty tables."""
+    result = db.execute(club_rows_query(table, club_id, since).execution_options(yield_per=BACKUP_BATCH_ROWS))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        for i, rows in enumerate(result.partitions()):
+            if i == 0:
+                writer.writerow(result.keys())
+            writer.writerows([csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    finally:
+        result.close()
+
+
+class ZipStream:
+    """Write-only, unseekable file object collecting what ZipFile writes until it is drained."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def write_entry(archive: zipfile.ZipFile, stream: ZipStream, name: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Writes `chunks` into the archive as `name`, yielding the archive bytes after each one. No entry if there are none."""
+    entry = None
+    try:
+        for chunk in chunks:
+            if entry is None:
+                entry = archive.open(name, mode="w", force_zip64=True)
+            entry.write(chunk)
+            yield stream.drain()
+    finally:
+        if entry is not None:
+            entry.close()
+    yield stream.drain()
+
+
+def begin_snapshot(db: Session, snapshot_id: Optional[str] = None) -> str:
+    """
+    Starts a read-only REPEATABLE READ transaction on `db`, importing `snapshot_id` if given.
+    Returns the id other sessions can import while this transaction stays open.
+    """
+    db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+    if snapshot_id is None:
+        return db.execute(text("SELECT pg_export_snapshot()")).scalar()
+    db.execute(text("SET TRANSACTION SNAPSHOT :snapshot_id"), {"snapshot_id": snapshot_id})
+    return snapshot_id
+
+
+_DONE = object()
+
+
+def _put(chunks: queue.Queue, item, cancelled: threading.Event) -> bool:
+    """Waits for room in the queue, giving up (False) once the backup is cancelled."""
+    while not cancelled.is_set():
+        try:
+            chunks.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _read_table(snapshot_id: str, table: Table, club_id: int, since: Optional[datetime], chunks: queue.Queue, cancelled: threading.Event):
+    db = BackupSession()
+    try:
+        begin_snapshot(db, snapshot_id)
+        for chunk in iter_table_csv(db, table, club_id, since):
+            if not _put(chunks, chunk, cancelled):
+                return
+        _put(chunks, _DONE, cancelled)
+    except Exception as e:
+        _put(chunks, e, cancelled)
+    finally:
+        db.close()
+
+
+def _drain(chunks: queue.Queue) -> Iterator[bytes]:
+    while True:
+        try:
+            item = chunks.get(timeout=BACKUP_READ_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise TimeoutError(f"No backup data for {BACKUP_READ_TIMEOUT_SECONDS:.0f} s")
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+@contextmanager
+def table_readers(club_id: int, since: Optional[datetime] = None, workers: int = BACKUP_WORKERS) -> Iterator[List[Tuple[str, Iterator[bytes]]]]:
+    """
+    Yields (file name, CSV chunks) for every table of the backup, in order. The chunks come
+    from parallel workers sharing one snapshot on PostgreSQL, from a single session otherwise.
+    """
+    tables = backup_tables(since)
+    names = [f"{table.name}.csv" for table in tables]
+    if engine.dialect.name != "postgresql" or workers <= 1:
+        db = BackupSession()
+        try:
+            if engine.dialect.name == "postgresql":
+                begin_snapshot(db)
+            yield [(name, iter_table_csv(db, table, club_id, since)) for name, table in zip(names, tables)]
+        finally:
+            db.close()
+        return
+
+    coordinator = BackupSession()
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup")
+    try:
+        snapshot_id = begin_snapshot(coordinator) # Must stay open until every worker has imported it
+        queues = [queue.Queue(maxsize=BACKUP_PREFETCH_BATCHES) for _ in tables]
+        # Submitted in archive order: a worker blocked on a full queue only waits for tables
+        # that are written before the ones still waiting for a worker.
+        for table, chunks in zip(tables, queues):
+            executor.submit(_read_table, snapshot_id, table, club_id, since, chunks, cancelled)
+        yield [(name, _drain(chunks)) for name, chunks in zip(names, queues)]
+    finally:
+        cancelled.set() # Unblocks the workers if the client went away
+        executor.shutdown(wait=True, cancel_futures=True)
+        coordinator.close()
+
+
+def change_watermark() -> datetime:
+    """Where the next incremental backup must start. Call it before the backup's snapshot is taken."""
+    if engine.dialect.name != "postgresql":
+        return datetime.now(timezone.utc)
+    db = BackupSession()
+    try:
+        return db.execute(CHANGE_WATERMARK_SQL).scalar()
+    finally:
+        db.close()
+
+
+class BackupsBusy(Exception):
+    pass
+
+
+def open_club_backup(club_id: int, since: Optional[datetime] = None) -> Iterator[bytes]:
+    """
+    Takes a backup slot and returns the stream of the club's backup archive, which releases it
+    once exhausted, closed or dropped. Raises BackupsBusy when no slot frees up within
+    BACKUP_WAIT_SECONDS, before anything is sent to the client.
+    """
+    if not backup_slots.acquire(timeout=BACKUP_WAIT_SECONDS):
+        raise BackupsBusy("Too many backups running, try again later.")
+    stream = stream_club_backup(club_id, since)
+    next(stream) # Runs it into its try block, so that closing it releases the slot even if never iterated
+    return stream
+
+
+def stream_club_backup(club_id: int, since: Optional[datetime] = None) -> Iterator[bytes]:
+    """
+    Yields a zip archive with one CSV per backup table, holding the club's rows (changed since
+    `since` for an incremental backup), and a manifest.json, after an empty first chunk.
+    Uses its own sessions, since the response outlives the request's. The caller holds a
+    backup slot, released when the stream ends: use open_club_backup.
+    """
+    try:
+        yield b""
+        next_since = change_watermark()
+        stream = ZipStream()
+        with table_readers(club_id, since) as tables:
+            with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for name, chunks in tables:
+                    for chunk in write_entry(archive, stream, name, chunks):
+                        if chunk: # Deflate holds small batches back
+                            yield chunk
+                archive.writestr("manifest.json", json.dumps({
+                    "club_id": club_id,
+                    "since": since.isoformat() if since else None,
+                    "next_since": next_since.isoformat(),
+                }))
+            yield stream.drain() # Manifest and central directory
+    finally:
+        backup_slots.release()
@@ -0,0 +1,92 @@
+from decimal import Decimal
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Adds a billed and/or paid delta to a member balance, creating it if needed.
+# The oldest unpaid month is re-read from the member's debts (indexed by member_id),
+# so callers must flush their changes to debts.is_paid first.
+APPLY_BALANCE_DELTA_SQL = text("""
+INSERT INTO member_balances (member_id, club_id, total_billed, total_paid, outstanding, oldest_unpaid_month)
+SELECT m.id, m.club_id, :billed, :paid, :billed - :paid,
+       (SELECT MIN(d.month) FROM debts d WHERE d.member_id = m.id AND d.is_paid = false)
+FROM members m
+WHERE m.id = :member_id
+ON CONFLICT (member_id) DO UPDATE
+SET total_billed = member_balances.total_billed + EXCLUDED.total_billed,
+    total_paid = member_balances.total_paid + EXCLUDED.total_paid,
+    outstanding = member_balances.outstanding + EXCLUDED.outstanding,
+    oldest_unpaid_month = EXCLUDED.oldest_unpaid_month
+""")
+
+# Recomputes debts.paid_amount and is_paid from payments, for debts that drifted.
+REPAIR_DEBT_PAID_AMOUNTS_SQL = text("""
+UPDATE debts d
+SET paid_amount = p.total_paid,
+    is_paid = p.total_paid >= d.total_amount
+FROM (
+    SELECT debts.id AS debt_id, COALESCE(SUM(payments.amount), 0) AS total_paid
+    FROM debts
+    JOIN members m ON m.id = debts.member_id
+    LEFT JOIN payments ON payments.debt_id = debts.id
+    WHERE CAST(:club_id AS INTEGER) IS NULL OR m.club_id = :club_id
+    GROUP BY debts.id
+) p
+WHERE d.id = p.debt_id
+  AND (d.paid_amount <> p.total_paid OR d.is_paid IS DISTINCT FROM (p.total_paid >= d.total_amount))
+""")
+
+# Recomputes balances from debts and payments. Only rows that actually differ are written.
+REPAIR_BALANCES_SQL = text("""
+INSERT INTO member_balances (member_id, club_id, total_billed, total_paid, outstanding, oldest_unpaid_month)
+SELECT m.id, m.club_id, COALESCE(d.total_billed, 0), COALESCE(p.total_paid, 0),
+       COALESCE(d.total_billed, 0) - COALESCE(p.total_paid, 0), d.oldest_unpaid_month
+FROM members m
+LEFT JOIN (
+    SELECT member_id, SUM(total_amount) AS total_billed, MIN(month) FILTER (WHERE is_paid = false) AS oldest_unpaid_month
+    FROM debts
+    GROUP BY member_id
+) d ON d.member_id = m.id
+LEFT JOIN (
+    SELECT debts.member_id, SUM(payments.amount) AS total_paid
+    FROM payments
+    JOIN debts ON debts.id = payments.debt_id
+    GROUP BY debts.member_id
+) p ON p.member_id = m.id
+WHERE m.club_id IS NOT NULL AND (CAST(:club_id AS INTEGER) IS NULL OR m.club_id = :club_id)
+ON CONFLICT (member_id) DO UPDATE
+SET total_billed = EXCLUDED.total_billed,
+    total_paid = EXCLUDED.total_paid,
+    outstanding = EXCLUDED.outstanding,
+    oldest_unpaid_month = EXCLUDED.oldest_unpaid_month
+WHERE (member_balances.total_billed, member_balances.total_paid, member_balances.outstanding, member_balances.oldest_unpaid_month)
+      IS DISTINCT FROM (EXCLUDED.total_billed, EXCLUDED.total_paid, EXCLUDED.outstanding, EXCLUDED.oldest_unpaid_month)
+""")
+
+
+def apply_balance_delta(db: Session, member_id: int, billed: Decimal = Decimal('0.00'), paid: Decimal = Decimal('0.00')):
+    """Updates the persisted balance of a member inside the caller's transaction."""
+    db.flush()
+    db.execute(APPLY_BALANCE_DELTA_SQL, {"member_id": member_id, "billed": billed, "paid": paid})
+
+
+def apply_balance_deltas(db: Session, paid_by_member: Dict[int, Decimal]):
+    """Adds paid amounts to many member balances with a single executemany."""
+    if not paid_by_member:
+        return
+    db.flush()
+    db.execute(APPLY_BALANCE_DELTA_SQL, [
+        {"member_id": member_id, "billed": Decimal('0.00'), "paid": paid}
+        for member_id, paid in paid_by_member.items()
+    ])
+
+
+def repair_member_balances(db: Session, club_id: Optional[int] = None) -> int:
+    """
+    Consistency repair: recomputes the paid amount of every debt and every member balance
+    (of one club or all of them) from debts and payments. Returns the number of balances that
+    were missing or wrong. The caller owns the transaction and must commit.
+    """
+    db.execute(REPAIR_DEBT_PAID_AMOUNTS_SQL, {"club_id": club_id})
+    return db.execute(REPAIR_BALANCES_SQL, {"club_id": club_id}).rowcount
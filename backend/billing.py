@@ -0,0 +1,138 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from decimal import Decimal
+from typing import Iterator, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+from .data_versions import bump_data_version, FINANCE
+from .database import SQLALCHEMY_DATABASE_URL, SessionLocal, engine
+
+# Most clubs billed in parallel by the platform-wide run. Each worker holds its own
+# connection, so keep it at or below the DB cores.
+DEBT_GENERATION_WORKERS = int(os.getenv("DEBT_GENERATION_WORKERS", min(8, os.cpu_count() or 1)))
+
+# The workers' connections come from this pool, so that a run never starves the API's
+if engine.dialect.name == "postgresql":
+    debt_generation_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, pool_size=DEBT_GENERATION_WORKERS, max_overflow=0
+    )
+else:
+    debt_generation_engine = engine
+DebtGenerationSession = sessionmaker(autocommit=False, autoflush=False, bind=debt_generation_engine)
+
+# Set-based monthly debt generation.
+# A single statement builds every debt of the month for a club and its items:
+# - 'eligible' computes the total for each active member (base fee + enrolled activities).
+# - 'new_debts' inserts them, skipping members that already have a debt for the month
+#   thanks to the unique (member_id, month) constraint. Running it twice concurrently is safe:
+#   the second run waits on the first one's rows and then skips them.
+# - The item CTEs only see the debts inserted by this very statement.
+# - 'balances' adds the new debts to the persisted member balances in the same transaction.
+GENERATE_MONTHLY_DEBTS_SQL = text("""
+WITH eligible AS (
+    SELECT m.id AS member_id,
+           CAST(:base_fee AS NUMERIC(10, 2)) + COALESCE(SUM(a.monthly_cost), 0) AS total_amount
+    FROM members m
+    LEFT JOIN member_activity ma ON ma.member_id = m.id
+    LEFT JOIN activities a ON a.id = ma.activity_id
+    WHERE m.club_id = :club_id AND m.is_active = true
+    GROUP BY m.id
+    HAVING CAST(:base_fee AS NUMERIC(10, 2)) + COALESCE(SUM(a.monthly_cost), 0) > 0
+),
+new_debts AS (
+    INSERT INTO debts (month, total_amount, is_paid, member_id)
+    SELECT :month, e.total_amount, false, e.member_id
+    FROM eligible e
+    ON CONFLICT (member_id, month) DO NOTHING
+    RETURNING id, member_id, total_amount
+),
+base_fee_items AS (
+    INSERT INTO debt_items (description, amount, debt_id, activity_id)
+    SELECT 'Cuota Social', CAST(:base_fee AS NUMERIC(10, 2)), nd.id, NULL
+    FROM new_debts nd
+    WHERE CAST(:base_fee AS NUMERIC(10, 2)) > 0
+    RETURNING id
+),
+activity_items AS (
+    INSERT INTO debt_items (description, amount, debt_id, activity_id)
+    SELECT 'Actividad: ' || a.name, a.monthly_cost, nd.id, a.id
+    FROM new_debts nd
+    JOIN member_activity ma ON ma.member_id = nd.member_id
+    JOIN activities a ON a.id = ma.activity_id
+    RETURNING id
+),
+balances AS (
+    INSERT INTO member_balances (member_id, club_id, total_billed, total_paid, outstanding, oldest_unpaid_month)
+    SELECT nd.member_id, :club_id, nd.total_amount, 0, nd.total_amount, :month
+    FROM new_debts nd
+    ON CONFLICT (member_id) DO UPDATE
+    SET total_billed = member_balances.total_billed + EXCLUDED.total_billed,
+        outstanding = member_balances.outstanding + EXCLUDED.outstanding,
+        oldest_unpaid_month = LEAST(member_balances.oldest_unpaid_month, EXCLUDED.oldest_unpaid_month)
+    RETURNING member_id
+)
+SELECT (SELECT COUNT(*) FROM eligible) AS eligible_count,
+       (SELECT COUNT(*) FROM new_debts) AS generated_count
+""")
+
+
+def generate_monthly_debts(db: Session, club: models.Club, month_date: date) -> Tuple[int, int]:
+    """
+    Generates the debts of `month_date` for every active member of `club` in one statement.
+    Returns (generated, skipped), where skipped are members that already had a debt for the month.
+    The caller owns the transaction and must commit.
+    """
+    base_fee = Decimal(str(club.base_fee)) if club.base_fee and club.base_fee > 0 else Decimal('0.00')
+
+    row = db.execute(GENERATE_MONTHLY_DEBTS_SQL, {
+        "club_id": club.id,
+        "month": month_date,
+        "base_fee": base_fee,
+    }).one()
+
+    generated = row.generated_count
+    return generated, row.eligible_count - generated
+
+
+def _generate_for_club(club_id: int, month_date: date) -> dict:
+    """Runs the generation of one club in its own session, connection and transaction."""
+    started = time.perf_counter()
+    db = DebtGenerationSession()
+    try:
+        club = db.query(models.Club).filter(models.Club.id == club_id).first()
+        generated, skipped = generate_monthly_debts(db, club, month_date)
+        bump_data_version(db, club.id, FINANCE)
+        db.commit()
+        result = {"club_id": club.id, "club_name": club.name, "generated": generated, "skipped": skipped, "error": None}
+    except Exception as e:
+        db.rollback()
+        result = {"club_id": club_id, "club_name": None, "generated": 0, "skipped": 0, "error": str(e)}
+    finally:
+        db.close()
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def generate_monthly_debts_for_all_clubs(month_date: date, max_workers: Optional[int] = None) -> Iterator[dict]:
+    """
+    Generates the debts of `month_date` for every active club, fanning the clubs out over a
+    bounded thread pool of at most DEBT_GENERATION_WORKERS. Yields one result per club as soon
+    as it finishes; a failing club is rolled back on its own and reported with its error
+    without affecting the others.
+    """
+    db = SessionLocal()
+    try:
+        club_ids = [club_id for club_id, in db.query(models.Club.id).filter(models.Club.is_active == True).order_by(models.Club.id)]
+    finally:
+        db.close()
+
+    max_workers = min(max_workers or DEBT_GENERATION_WORKERS, DEBT_GENERATION_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_generate_for_club, club_id, month_date) for club_id in club_ids]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,289 @@
+"""
+Member check-in (turnstile / front desk access validation).
+
+Each API worker keeps a compact in-memory index per club that maps member numbers and DNIs to
+what a check-in needs: active flag, enrolled activity ids and balance status. A lookup is a
+dict access, so validating a scan never touches the ledger.
+
+The index of a club is built lazily with two queries and dropped, in every worker, as soon as a
+member, enrollment, activity, debt or payment write is committed (invalidation bus events for the
+members, finance and reference scopes). CHECKIN_INDEX_TTL_SECONDS bounds its age should an event be lost.
+
+Check-ins are logged asynchronously: rows are queued in memory and written by a background
+thread with one bulk insert per batch.
+
+Micro-benchmark: python -m backend.checkin
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .data_versions import FINANCE, MEMBERS, REFERENCE
+from .database import SessionLocal
+from .invalidation import subscribe
+
+CHECKIN_INDEX_TTL_SECONDS = float(os.getenv("CHECKIN_INDEX_TTL_SECONDS", 300))
+# Months of unpaid debt a member may carry and still be considered up to date (0: only the current month)
+CHECKIN_ARREARS_GRACE_MONTHS = int(os.getenv("CHECKIN_ARREARS_GRACE_MONTHS", 0))
+CHECKIN_LOG_BATCH_SIZE = int(os.getenv("CHECKIN_LOG_BATCH_SIZE", 200))
+CHECKIN_LOG_FLUSH_SECONDS = float(os.getenv("CHECKIN_LOG_FLUSH_SECONDS", 2))
+
+
+class MemberAccess(NamedTuple):
+    member_id: int
+    first_name: str
+    last_name: str
+    is_active: bool
+    activity_ids: FrozenSet[int]
+    outstanding: Decimal
+    oldest_unpaid_month: Optional[date]
+
+
+class CheckInDecision(NamedTuple):
+    allowed: bool
+    reason: str # ok, not_found, ambiguous, inactive, not_enrolled, in_arrears
+    member: Optional[MemberAccess]
+
+
+def normalize_code(code: str) -> str:
+    """Scanned codes may carry dots, spaces or dashes (e.g. a DNI printed as 30.123.456)."""
+    return "".join(c for c in code if c.isalnum()).upper()
+
+
+def arrears_cutoff(today: date) -> date:
+    """Unpaid debts from months before this date mean the member is in arrears."""
+    months = today.year * 12 + today.month - 1 - CHECKIN_ARREARS_GRACE_MONTHS
+    return date(months // 12, months % 12 + 1, 1)
+
+
+# Index entry of a code shared by several active members: they cannot be told apart
+AMBIGUOUS = object()
+
+
+class ClubAccessIndex:
+    """
+    Member numbers and DNIs of one club, normalized, mapped to their MemberAccess. When members
+    share a code (e.g. an inactive record and its re-registration) the active one wins; a code
+    shared by several active members maps to AMBIGUOUS.
+    """
+
+    def __init__(self, members: List[MemberAccess], codes: List[tuple]):
+        self.by_member_number: Dict[str, object] = {}
+        self.by_dni: Dict[str, object] = {}
+        by_id = {member.member_id: member for member in members}
+        for member_id, member_number, dni in codes:
+            if member_number:
+                self._add(self.by_member_number, normalize_code(member_number), by_id[member_id])
+            if dni:
+                self._add(self.by_dni, normalize_code(dni), by_id[member_id])
+
+    @staticmethod
+    def _add(index: Dict[str, object], code: str, member: MemberAccess):
+        current = index.get(code)
+        if current is None or (current is not AMBIGUOUS and not current.is_active):
+            index[code] = member
+        elif member.is_active:
+            index[code] = AMBIGUOUS # Both active; an inactive one never displaces an entry
+
+    def lookup(self, code: str):
+        """The MemberAccess of a code, AMBIGUOUS or None. Member numbers take precedence over DNIs."""
+        key = normalize_code(code)
+        return self.by_member_number.get(key) or self.by_dni.get(key)
+
+    def __len__(self):
+        return len(self.by_member_number) + len(self.by_dni)
+
+
+def build_club_access_index(db: Session, club_id: int) -> ClubAccessIndex:
+    """Loads the access data of every member of a club: one query for members, one for enrollments."""
+    activity_ids = defaultdict(set)
+    enrollments = db.query(
+        models.member_activity_association.c.member_id,
+        models.member_activity_association.c.activity_id
+    ).join(models.Member, models.Member.id == models.member_activity_association.c.member_id).filter(
+        models.Member.club_id == club_id
+    )
+    for member_id, activity_id in enrollments:
+        activity_ids[member_id].add(activity_id)
+
+    rows = db.query(
+        models.Member.id,
+        models.Member.first_name,
+        models.Member.last_name,
+        models.Member.is_active,
+        models.Member.member_number,
+        models.Member.dni,
+        models.MemberBalance.outstanding,
+        models.MemberBalance.oldest_unpaid_month
+    ).outerjoin(models.Member.balance).filter(models.Member.club_id == club_id).all()
+
+    members = [
+        MemberAccess(
+            member_id=row.id,
+            first_name=row.first_name,
+            last_name=row.last_name,
+            is_active=bool(row.is_active),
+            activity_ids=frozenset(activity_ids.get(row.id, ())),
+            outstanding=row.outstanding or Decimal('0.00'),
+            oldest_unpaid_month=row.oldest_unpaid_month
+        )
+        for row in rows
+    ]
+    return ClubAccessIndex(members, [(row.id, row.member_number, row.dni) for row in rows])
+
+
+class AccessIndexCache:
+    """
+    Per-club ClubAccessIndex cache of this process. Thread-safe; a club is built by one thread
+    at a time, and an index built while the club was invalidated is not kept.
+    """
+
+    def __init__(self, ttl_seconds: float = CHECKIN_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._indexes: Dict[int, tuple] = {} # club_id -> (index, built_at)
+        self._generations: Dict[int, int] = defaultdict(int)
+        self._build_locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, club_id: int) -> ClubAccessIndex:
+        cached = self._indexes.get(club_id)
+        if cached and time.monotonic() - cached[1] < self.ttl_seconds:
+            return cached[0]
+
+        with self._lock:
+            build_lock = self._build_locks[club_id]
+        with build_lock:
+            cached = self._indexes.get(club_id)
+            if cached and time.monotonic() - cached[1] < self.ttl_seconds:
+                return cached[0] # Built by another thread while we waited
+
+            generation = self._generations[club_id]
+            built_at = time.monotonic()
+            index = build_club_access_index(db, club_id)
+            with self._lock:
+                if self._generations[club_id] == generation:
+                    self._indexes[club_id] = (index, built_at)
+            return index
+
+    def invalidate(self, club_id: Optional[int]):
+        """Drops the index of a club, or of every club when club_id is None."""
+        with self._lock:
+            club_ids = list(self._indexes) if club_id is None else [club_id]
+            for cid in club_ids:
+                self._generations[cid] += 1
+                self._indexes.pop(cid, None)
+
+
+access_index = AccessIndexCache()
+
+
+@subscribe(MEMBERS, FINANCE, REFERENCE)
+def _invalidate_access_index(club_id, keys):
+    access_index.invalidate(club_id)
+
+
+def check_in(db: Session, club_id: int, code: str, activity_id: Optional[int] = None, today: Optional[date] = None) -> CheckInDecision:
+    """Decides whether the member scanned with `code` may enter (to `activity_id`, if given)."""
+    member = access_index.get(db, club_id).lookup(code)
+    if member is None:
+        return CheckInDecision(False, "not_found", None)
+    if member is AMBIGUOUS:
+        return CheckInDecision(False, "ambiguous", None)
+    if not member.is_active:
+        return CheckInDecision(False, "inactive", member)
+    if activity_id is not None and activity_id not in member.activity_ids:
+        return CheckInDecision(False, "not_enrolled", member)
+    if member.outstanding > 0 and member.oldest_unpaid_month and member.oldest_unpaid_month < arrears_cutoff(today or date.today()):
+        return CheckInDecision(False, "in_arrears", member)
+    return CheckInDecision(True, "ok", member)
+
+
+class CheckInLogWriter:
+    """
+    Queues check-in log rows and writes them from a background thread, one bulk insert per
+    batch: when CHECKIN_LOG_BATCH_SIZE rows are queued or every CHECKIN_LOG_FLUSH_SECONDS.
+    """
+
+    def __init__(self, batch_size: int = CHECKIN_LOG_BATCH_SIZE, flush_seconds: float = CHECKIN_LOG_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def log(self, club_id: int, code: str, decision: CheckInDecision, activity_id: Optional[int], user_id: Optional[int]):
+        with self._lock:
+            self._rows.append({
+                "club_id": club_id,
+                "member_id": decision.member.member_id if decision.member else None,
+                "activity_id": activity_id,
+                "user_id": user_id,
+                "code": code,
+                "allowed": decision.allowed,
+                "reason": decision.reason,
+                "checked_in_at": datetime.now(timezone.utc),
+            })
+            queued = len(self._rows)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="checkin-log-writer", daemon=True)
+                self._thread.start()
+        if queued >= self.batch_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Writes every queued row. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            db = SessionLocal()
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    db.execute(insert(models.CheckIn), rows[start:start + self.batch_size])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"ERROR:   Could not write {len(rows)} check-in log rows: {e}")
+                return 0
+            finally:
+                db.close()
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+
+check_in_log = CheckInLogWriter()
+
+
+def benchmark(members: int = 5_000, lookups: int = 200_000) -> float:
+    """Looks up `lookups` codes in a synthetic club index and returns lookups per second."""
+    index = ClubAccessIndex(
+        [
+            MemberAccess(i, "Nombre", "Apellido", True, frozenset({1, 2}), Decimal('0.00'), None)
+            for i in range(members)
+        ],
+        [(i, str(i), f"30.{i:03d}.000") for i in range(members)]
+    )
+    started = time.perf_counter()
+    for i in range(lookups):
+        index.lookup(str(i % members) if i % 2 else f"30.{i % members:03d}.000")
+    return lookups / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    print(f"{benchmark():,.0f} lookups/s")
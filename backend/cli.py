@@ -0,0 +1,205 @@
+"""
+Maintenance commands for the backend.
+
+Usage (from the project root, e.g. inside the backend container):
+    python -m backend.cli generate-debts 2026-03 [--workers 4]
+    python -m backend.cli rebuild-summary [--club-id 3]
+    python -m backend.cli repair-balances [--club-id 3]
+    python -m backend.cli explain-queries --club-id 3 [--router members]
+    python -m backend.cli bench-auth --email admin@club.com [--iterations 2000]
+    python -m backend.cli calibrate-hashing [--target-ms 250] [--memory-kib 65536]
+    python -m backend.cli restore-club backup_club_3.zip --club-id 3
+    python -m backend.cli prune-tombstones --before 2026-01-01
+"""
+import argparse
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+from .balances import repair_member_balances
+from .billing import generate_monthly_debts_for_all_clubs
+from .data_versions import bump_data_version, FINANCE
+from .database import SessionLocal
+from .password_hashing import calibrate
+from .query_plans import explain_hot_queries
+from .restore import restore_club
+from .security import benchmark_authentication
+from .sync import prune_deleted_rows
+from .summary import rebuild_monthly_summary
+
+
+def _parse_month(value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m").date().replace(day=1)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Formato de mes inválido. Use AAAA-MM.")
+
+
+def _parse_date(value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError("Formato de fecha inválido. Use AAAA-MM-DD.")
+
+
+def generate_debts(args) -> int:
+    started = time.perf_counter()
+    total_generated = total_skipped = failed = 0
+    for result in generate_monthly_debts_for_all_clubs(args.month, max_workers=args.workers):
+        if result["error"]:
+            failed += 1
+            print(f"ERROR:   club {result['club_id']}: {result['error']} ({result['elapsed_ms']} ms)")
+            continue
+        total_generated += result["generated"]
+        total_skipped += result["skipped"]
+        print(f"INFO:    club {result['club_id']} ({result['club_name']}): "
+              f"{result['generated']} generated, {result['skipped']} skipped ({result['elapsed_ms']} ms)")
+    elapsed = time.perf_counter() - started
+    print(f"INFO:    {total_generated} debts generated, {total_skipped} skipped, {failed} clubs failed in {elapsed:.1f} s")
+    return 1 if failed else 0
+
+
+def rebuild_summary(args) -> int:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rows = rebuild_monthly_summary(db, club_id=args.club_id)
+        bump_data_version(db, args.club_id, FINANCE)
+        db.commit()
+    finally:
+        db.close()
+    scope = f"club {args.club_id}" if args.club_id else "all clubs"
+    print(f"INFO:    club_monthly_summary rebuilt for {scope}: {rows} rows in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+def repair_balances(args) -> int:
+    db = SessionLocal()
+    try:
+        repaired = repair_member_balances(db, club_id=args.club_id)
+        if repaired:
+            bump_data_version(db, args.club_id, FINANCE)
+        db.commit()
+    finally:
+        db.close()
+    scope = f"club {args.club_id}" if args.club_id else "all clubs"
+    print(f"INFO:    member balances checked for {scope}: {repaired} repaired")
+    return 0
+
+
+def explain_queries(args) -> int:
+    db = SessionLocal()
+    try:
+        for router, description, plan in explain_hot_queries(db, args.club_id, router=args.router):
+            print(f"=== [{router}] {description}")
+            print(plan)
+            print()
+    finally:
+        db.close()
+    return 0
+
+
+def bench_auth(args) -> int:
+    db = SessionLocal()
+    try:
+        results = benchmark_authentication(db, args.email, iterations=args.iterations)
+    finally:
+        db.close()
+    baseline = results["user query"]
+    for path, microseconds in results.items():
+        print(f"INFO:    {path:<16} {microseconds:8.1f} us/request ({baseline - microseconds:+8.1f} us saved)")
+    return 0
+
+
+def calibrate_hashing(args) -> int:
+    result = calibrate(args.target_ms, memory_cost=args.memory_kib, parallelism=args.parallelism)
+    print(f"INFO:    argon2 hash takes {result['elapsed_ms']:.0f} ms on this host with:")
+    print(f"ARGON2_TIME_COST={result['time_cost']}")
+    print(f"ARGON2_MEMORY_COST={result['memory_cost']}")
+    print(f"ARGON2_PARALLELISM={result['parallelism']}")
+    return 0
+
+
+def restore_club_backup(args) -> int:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        with zipfile.ZipFile(args.archive) as archive:
+            tables = restore_club(db, args.club_id, archive)
+        db.commit()
+    except (zipfile.BadZipFile, ValueError) as e:
+        db.rollback()
+        print(f"ERROR:   Invalid backup archive: {e}")
+        return 1
+    finally:
+        db.close()
+    for table, rows in tables.items():
+        print(f"INFO:    {table}: {rows} rows")
+    print(f"INFO:    club {args.club_id} restored from {args.archive}: {sum(tables.values())} rows in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+def prune_tombstones(args) -> int:
+    """
+    Tombstones are only needed until every incremental backup chain and sync client has moved
+    past them. Sync clients left behind get a 410 and sync in full.
+    """
+    db = SessionLocal()
+    try:
+        pruned = prune_deleted_rows(db, args.before)
+        db.commit()
+    finally:
+        db.close()
+    print(f"INFO:    {pruned} tombstones deleted before {args.before:%Y-%m-%d}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_debts = subparsers.add_parser("generate-debts", help="Generate a month's debts for every active club")
+    parser_debts.add_argument("month", type=_parse_month, help="Month to generate, as YYYY-MM")
+    parser_debts.add_argument("--workers", type=int, default=None, help="Clubs processed in parallel")
+    parser_debts.set_defaults(func=generate_debts)
+
+    parser_summary = subparsers.add_parser("rebuild-summary", help="Rebuild the monthly financial rollup from club_transactions")
+    parser_summary.add_argument("--club-id", type=int, default=None, help="Only rebuild this club")
+    parser_summary.set_defaults(func=rebuild_summary)
+
+    parser_balances = subparsers.add_parser("repair-balances", help="Recompute member balances from debts and payments")
+    parser_balances.add_argument("--club-id", type=int, default=None, help="Only repair this club")
+    parser_balances.set_defaults(func=repair_balances)
+
+    parser_explain = subparsers.add_parser("explain-queries", help="EXPLAIN ANALYZE the routers' hot queries for a club")
+    parser_explain.add_argument("--club-id", type=int, required=True, help="Club whose data is used")
+    parser_explain.add_argument("--router", default=None, help="Only the queries of this router")
+    parser_explain.set_defaults(func=explain_queries)
+
+    parser_auth = subparsers.add_parser("bench-auth", help="Measure the per-request authentication overhead by path")
+    parser_auth.add_argument("--email", required=True, help="Existing user to authenticate as")
+    parser_auth.add_argument("--iterations", type=int, default=2000, help="Requests simulated per path")
+    parser_auth.set_defaults(func=bench_auth)
+
+    parser_hashing = subparsers.add_parser("calibrate-hashing", help="Pick argon2 parameters for a target hash latency on this host")
+    parser_hashing.add_argument("--target-ms", type=float, default=250, help="Target time per hash, in milliseconds")
+    parser_hashing.add_argument("--memory-kib", type=int, default=65536, help="Starting memory cost, in KiB")
+    parser_hashing.add_argument("--parallelism", type=int, default=1, help="Argon2 lanes per hash")
+    parser_hashing.set_defaults(func=calibrate_hashing)
+
+    parser_restore = subparsers.add_parser("restore-club", help="Replace a club's data with a backup archive from /admin/db-backup-csv")
+    parser_restore.add_argument("archive", help="Path to the backup zip")
+    parser_restore.add_argument("--club-id", type=int, required=True, help="Existing club whose data is replaced")
+    parser_restore.set_defaults(func=restore_club_backup)
+
+    parser_prune = subparsers.add_parser("prune-tombstones", help="Delete deleted_rows tombstones older than a date")
+    parser_prune.add_argument("--before", type=_parse_date, required=True, help="Cutoff date, as YYYY-MM-DD")
+    parser_prune.set_defaults(func=prune_tombstones)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
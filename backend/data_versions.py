@@ -0,0 +1,95 @@
+"""
+Per-club data versions and conditional GETs.
+
+Every write that changes what a cached read endpoint returns bumps the club's version for one
+or more scopes, in the same transaction as the write. Read endpoints declare the scopes they
+depend on with `Depends(conditional_get(...))`: the ETag is derived from those versions, and a
+request whose If-None-Match still matches is answered 304 after a single primary-key lookup,
+without running the endpoint's queries or serializing its response.
+
+Each bump is also published on the invalidation bus (backend/invalidation.py) with the scope as
+entity, so the in-process caches of every worker can subscribe to the scopes they depend on.
+"""
+import hashlib
+import os
+from typing import Dict, Optional, Sequence
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import get_db
+from .invalidation import publish
+from .security import get_current_user
+
+# Scopes
+REFERENCE = "reference" # Categories, activities, club settings, club users
+FINANCE = "finance" # Debts, payments, club transactions, balances and the rollups
+MEMBERS = "members" # Members and their enrollments
+
+# Changes the ETags when a deploy changes the shape of the responses
+APP_VERSION = os.getenv("APP_VERSION", "")
+
+BUMP_DATA_VERSIONS_SQL = text("""
+INSERT INTO club_data_versions (club_id, scope, version)
+SELECT c.id, s.scope, 1
+FROM clubs c
+CROSS JOIN unnest(CAST(:scopes AS VARCHAR[])) AS s(scope)
+WHERE CAST(:club_id AS INTEGER) IS NULL OR c.id = :club_id
+ON CONFLICT (club_id, scope) DO UPDATE
+SET version = club_data_versions.version + 1
+""")
+
+
+def bump_data_version(db: Session, club_id: Optional[int], *scopes: str):
+    """
+    Bumps the versions of `scopes` for a club (every club when club_id is None) inside the
+    caller's transaction. Call it right before the commit: the row stays locked until then.
+    """
+    db.execute(BUMP_DATA_VERSIONS_SQL, {"club_id": club_id, "scopes": list(scopes)})
+    for scope in scopes:
+        publish(db, club_id, scope)
+
+
+def get_data_versions(db: Session, club_id: int, scopes: Sequence[str]) -> Dict[str, int]:
+    versions = dict(db.query(models.ClubDataVersion.scope, models.ClubDataVersion.version).filter(
+        models.ClubDataVersion.club_id == club_id,
+        models.ClubDataVersion.scope.in_(scopes)
+    ).all())
+    return {scope: versions.get(scope, 0) for scope in scopes}
+
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def conditional_get(*scopes: str):
+    """
+    Dependency for GET endpoints whose response only depends on the club's `scopes`, the user
+    and the request URL. Sets the ETag, or answers 304 when the client already has it.
+    """
+    def check_etag(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db),
+        current_user: models.User = Depends(get_current_user)
+    ):
+        versions = get_data_versions(db, current_user.club_id, scopes)
+        etag = make_etag(
+            APP_VERSION, current_user.club_id, current_user.id, current_user.role,
+            request.url.path, request.url.query, *(f"{scope}:{versions[scope]}" for scope in scopes)
+        )
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return check_etag
@@ -0,0 +1,159 @@
+"""
+Cache invalidation bus shared by every API worker, on top of PostgreSQL LISTEN/NOTIFY.
+
+Writers call `publish(db, club_id, entity, keys)` inside their transaction. On PostgreSQL this
+issues a pg_notify on the same connection, so the event only leaves the database when the
+transaction commits, and is dropped with it on rollback. Once the session commits, the
+event is also dispatched in this process right away.
+
+Every worker runs a listener thread (`invalidation_listener`, started from the app lifespan) holding one
+dedicated connection that LISTENs on the channel and dispatches the events of the other
+processes (the CLI included) to the handlers registered with `subscribe`. After losing the
+connection the listener reconnects and drops every cache, since events may have been missed.
+
+With any other database (SQLite in tests) the bus is only in-process.
+"""
+import json
+import os
+import select
+import threading
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, engine
+
+CHANNEL = "cache_invalidation"
+ALL = "*" # Entity of events that affect every cache of a club (e.g. the club was deleted)
+USERS = "users" # Keys are user emails
+INVALIDATION_LISTENER_RETRY_SECONDS = float(os.getenv("INVALIDATION_LISTENER_RETRY_SECONDS", 2))
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7900
+NOTIFY_SQL = text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS TEXT[])) AS payload")
+
+# Identifies this process, so that it skips its own events when they come back from the database
+PROCESS_ID = uuid.uuid4().hex
+
+_handlers: Dict[str, List[Callable]] = defaultdict(list)
+
+
+def subscribe(*entities: str):
+    """Decorator registering `handler(club_id, keys)` for events of `entities`. club_id None means every club."""
+    def register(handler: Callable[[Optional[int], List[str]], None]):
+        for entity in entities:
+            _handlers[entity].append(handler)
+        return handler
+    return register
+
+
+def dispatch(club_id: Optional[int], entity: str, keys: Iterable[str] = ()):
+    """Runs the handlers of an event in this process. Events for ALL reach every handler once."""
+    if entity == ALL:
+        handlers = list({id(handler): handler for handlers in _handlers.values() for handler in handlers}.values())
+    else:
+        handlers = _handlers.get(entity, [])
+    for handler in handlers:
+        try:
+            handler(club_id, list(keys))
+        except Exception as e:
+            print(f"ERROR:   Cache invalidation handler {handler.__qualname__} failed: {e}")
+
+
+def notification_payloads(club_id: Optional[int], entity: str, keys: List[str]) -> Iterator[str]:
+    """The NOTIFY payloads of an event, its keys split across as many as needed to fit in NOTIFY_PAYLOAD_LIMIT."""
+    def payload(batch: List[str]) -> str:
+        return json.dumps({"origin": PROCESS_ID, "club_id": club_id, "entity": entity, "keys": batch})
+
+    empty_size = len(payload([]))
+    batch, size = [], empty_size
+    for key in keys:
+        key_size = len(json.dumps(key)) + 2 # ASCII-only JSON, plus the separator
+        if batch and size + key_size > NOTIFY_PAYLOAD_LIMIT:
+            yield payload(batch)
+            batch, size = [], empty_size
+        batch.append(key)
+        size += key_size
+    yield payload(batch)
+
+
+def publish(db: Session, club_id: Optional[int], entity: str, keys: Iterable[str] = ()):
+    """
+    Announces a change of `entity` for a club (every club when club_id is None), optionally
+    limited to some keys. Delivered to every process once `db` commits; events with many keys
+    are sent as several notifications.
+    """
+    keys = list(keys)
+    db.info.setdefault("pending_invalidations", []).append((club_id, entity, keys))
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(NOTIFY_SQL, {"channel": CHANNEL, "payloads": list(notification_payloads(club_id, entity, keys))})
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _dispatch_committed_events(session: Session):
+    for club_id, entity, keys in session.info.pop("pending_invalidations", []):
+        dispatch(club_id, entity, keys)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_rolled_back_events(session: Session):
+    session.info.pop("pending_invalidations", None)
+
+
+class InvalidationListener:
+    """Background thread that LISTENs on the channel and dispatches the events of other processes."""
+
+    def __init__(self, retry_seconds: float = INVALIDATION_LISTENER_RETRY_SECONDS):
+        self.retry_seconds = retry_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None and engine.dialect.name == "postgresql":
+            self._thread = threading.Thread(target=self._run, name="cache-invalidation-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.retry_seconds + 1)
+            self._thread = None
+
+    def _run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                connection.driver_connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                if connected_before:
+                    dispatch(None, ALL) # Events sent while disconnected were lost
+                connected_before = True
+                self._listen(connection.driver_connection)
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"ERROR:   Cache invalidation listener disconnected: {e}")
+                    self._stop.wait(self.retry_seconds)
+            finally:
+                if connection is not None:
+                    connection.invalidate() # Never hand a LISTENing connection back to the pool
+
+    def _listen(self, driver_connection):
+        while not self._stop.is_set():
+            # Wake up regularly to notice stop(); notifications wake us up at once
+            if select.select([driver_connection], [], [], 1.0) == ([], [], []):
+                continue
+            driver_connection.poll()
+            while driver_connection.notifies:
+                notification = driver_connection.notifies.pop(0)
+                message = json.loads(notification.payload)
+                if message.get("origin") != PROCESS_ID:
+                    dispatch(message.get("club_id"), message["entity"], message.get("keys", []))
+
+
+invalidation_listener = InvalidationListener()
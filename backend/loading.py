@@ -0,0 +1,51 @@
+"""
+Eager-loading options shaped from the response models.
+
+`response_loader_options(models.Member, schemas.Member)` walks the Pydantic schema and, for
+every field that is a relationship of the SQLAlchemy model and is serialized as a nested model,
+adds a `selectinload` chain. Serializing the response then costs one extra query per
+relationship level, whatever the page size, instead of one lazy load per row.
+"""
+import types
+from functools import lru_cache
+from typing import Union, get_args, get_origin
+
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import selectinload
+
+
+def _nested_schema(annotation):
+    """The Pydantic model inside an annotation such as Optional[X] or List[X], if any."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    if get_origin(annotation) in (Union, types.UnionType, list):
+        for arg in get_args(annotation):
+            nested = _nested_schema(arg)
+            if nested is not None:
+                return nested
+    return None
+
+
+def _loader_chains(model, schema, parent_loader, visited) -> list:
+    schema.model_rebuild(raise_errors=False) # Resolve forward references such as Optional["User"]
+    relationships = inspect(model).relationships
+    chains = []
+    for name, field in schema.model_fields.items():
+        if name not in relationships:
+            continue
+        nested_schema = _nested_schema(field.annotation)
+        if nested_schema is None or nested_schema in visited:
+            continue
+
+        attribute = getattr(model, name)
+        loader = selectinload(attribute) if parent_loader is None else parent_loader.selectinload(attribute)
+        nested_chains = _loader_chains(relationships[name].mapper.class_, nested_schema, loader, visited | {nested_schema})
+        chains.extend(nested_chains or [loader])
+    return chains
+
+
+@lru_cache(maxsize=None)
+def response_loader_options(model, schema) -> tuple:
+    """Loader options that load everything `schema` serializes from `model` instances."""
+    return tuple(_loader_chains(model, schema, None, frozenset({schema})))
@@ -6,7 +6,10 @@ from contextlib import asynccontextmanager
 import locale
 
 from . import models, database, security
-from .routers import auth, members, users, activities, debts, club, superadmin, categories, transactions, reports, account, admin
+from .checkin import check_in_log
+from .invalidation import invalidation_listener
+from .password_hashing import hashing_pool
+from .routers import auth, members, users, activities, debts, club, superadmin, categories, transactions, reports, account, admin, checkin, sync
 
 # --- Lifespan Events ---
 @asynccontextmanager
@@ -52,9 +55,14 @@ async def lifespan(app: FastAPI):
     else:
         print("INFO:     SUPERADMIN_EMAIL or SUPERADMIN_PASSWORD not set. Skipping superadmin creation.")
     db.close()
+
+    invalidation_listener.start() # Drop this worker's caches when other processes change data
     
     yield
     # Code to run on shutdown
+    invalidation_listener.stop()
+    check_in_log.flush() # Write the check-ins still queued
+    hashing_pool.shutdown()
     print("INFO:     Application shutdown.")
 
 # --- App Initialization ---
@@ -99,6 +107,8 @@ app.include_router(transactions.router)
 app.include_router(reports.router)
 app.include_router(account.router)
 app.include_router(admin.router)
+app.include_router(checkin.router)
+app.include_router(sync.router)
 
 
 # --- Root Endpoint ---
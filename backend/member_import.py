@@ -0,0 +1,160 @@
+"""
+Bulk member import / upsert from CSV.
+
+Columns (header names are case-insensitive) are the fields of schemas.MemberCreate:
+    first_name, last_name, email, phone, dni, birth_date (YYYY-MM-DD), member_type, member_number
+plus an optional `activities` column with activity names or ids separated by "|".
+
+Rows are validated with MemberCreate and matched against the club's members by DNI, or by
+email when there is no DNI, with one lookup per chunk. Rows whose email belongs to another
+member of the club are rejected, as on member creation. New members are inserted and existing
+ones updated with bulk statements, and activity enrollments go straight into member_activity.
+Invalid rows are reported and skipped without aborting the file.
+"""
+import csv
+from typing import IO, Dict, List
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .payment_import import _chunks
+
+IMPORT_CHUNK_SIZE = 1000
+
+MEMBER_FIELDS = list(schemas.MemberCreate.model_fields)
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def _resolve_activities(value: str, activities_by_key: Dict[str, int]) -> tuple:
+    """Returns (activity ids, unknown tokens) for an `activities` cell."""
+    activity_ids, unknown = set(), []
+    for token in (t.strip() for t in value.split("|")):
+        if not token:
+            continue
+        activity_id = activities_by_key.get(token.lower())
+        if activity_id is None:
+            unknown.append(token)
+        else:
+            activity_ids.add(activity_id)
+    return activity_ids, unknown
+
+
+def _find_existing(db: Session, club_id: int, members: List[schemas.MemberCreate]) -> tuple:
+    """
+    One query per chunk for the club members matching any DNI or email of the chunk.
+    Returns (DNI -> member id, email -> member ids) lookups.
+    """
+    dnis = {m.dni for m in members if m.dni}
+    emails = {m.email for m in members if m.email}
+    if not dnis and not emails:
+        return {}, {}
+
+    existing = db.query(models.Member.id, models.Member.dni, models.Member.email).filter(
+        models.Member.club_id == club_id,
+        or_(models.Member.dni.in_(dnis), models.Member.email.in_(emails))
+    ).all()
+    by_dni = {row.dni: row.id for row in existing if row.dni}
+    by_email = {}
+    for row in existing:
+        if row.email:
+            by_email.setdefault(row.email, set()).add(row.id)
+    return by_dni, by_email
+
+
+def import_members(db: Session, csv_file: IO[str], club_id: int, delimiter: str = ",") -> List[dict]:
+    """
+    Imports the members of `csv_file` into the club. Nothing is committed; the caller commits once.
+    Returns one result per row with its status ("created", "updated" or "error").
+    """
+    activities = db.query(models.Activity.id, models.Activity.name).filter(models.Activity.club_id == club_id).all()
+    activities_by_key = {}
+    for activity in activities:
+        activities_by_key[str(activity.id)] = activity.id
+        activities_by_key[(activity.name or "").lower()] = activity.id
+
+    reader = csv.DictReader(csv_file, delimiter=delimiter)
+    results = []
+    seen_keys = set()
+
+    # Line 1 is the header
+    for chunk in _chunks(enumerate(reader, start=2), IMPORT_CHUNK_SIZE):
+        valid = [] # (result, member, activity ids)
+        for line_number, raw in chunk:
+            row = {key.strip().lower(): (value or "").strip() for key, value in raw.items() if key}
+            result = {"row": line_number, "dni": row.get("dni") or None, "member_id": None}
+            results.append(result)
+
+            try:
+                member = schemas.MemberCreate(**{field: row[field] for field in MEMBER_FIELDS if row.get(field)})
+            except ValidationError as e:
+                result.update(status="error", detail=_validation_message(e))
+                continue
+
+            keys = [key for key in (("dni", member.dni), ("email", member.email)) if key[1]]
+            duplicated = next((key for key in keys if key in seen_keys), None)
+            if duplicated:
+                result.update(status="error", detail=f"Duplicated {duplicated[0]} in the file")
+                continue
+            seen_keys.update(keys)
+
+            activity_ids, unknown = _resolve_activities(row.get("activities", ""), activities_by_key)
+            if unknown:
+                result.update(status="error", detail=f"Unknown activities: {', '.join(unknown)}")
+                continue
+
+            valid.append((result, member, activity_ids))
+
+        if not valid:
+            continue
+
+        by_dni, by_email = _find_existing(db, club_id, [member for _, member, _ in valid])
+
+        new_rows, new_results, updates = [], [], []
+        for result, member, _ in valid:
+            email_ids = by_email.get(member.email, set()) if member.email else set()
+            if member.dni:
+                existing_id = by_dni.get(member.dni)
+            elif len(email_ids) > 1:
+                result.update(status="error", detail="Several members of the club have this email")
+                continue
+            else:
+                existing_id = next(iter(email_ids), None)
+            # Emails are unique per club, as on member creation
+            if email_ids - {existing_id}:
+                result.update(status="error", detail="Email already used by another member of the club")
+                continue
+            values = member.model_dump(exclude_unset=True)
+            if existing_id:
+                result.update(status="updated", detail=None, member_id=existing_id)
+                updates.append({"id": existing_id, **values})
+            else:
+                values.setdefault("member_type", models.MemberTypeEnum.NA.value)
+                new_rows.append({**values, "club_id": club_id, "is_active": True})
+                new_results.append(result)
+
+        if new_rows:
+            new_ids = db.execute(
+                insert(models.Member).returning(models.Member.id, sort_by_parameter_order=True),
+                new_rows
+            ).scalars().all()
+            for result, member_id in zip(new_results, new_ids):
+                result.update(status="created", detail=None, member_id=member_id)
+        if updates:
+            db.execute(update(models.Member), updates)
+
+        enrollments = [
+            {"member_id": result["member_id"], "activity_id": activity_id}
+            for result, _, activity_ids in valid
+            if result["member_id"]
+            for activity_id in activity_ids
+        ]
+        if enrollments:
+            db.execute(pg_insert(models.member_activity_association).on_conflict_do_nothing(), enrollments)
+
+    return results
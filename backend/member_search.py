@@ -0,0 +1,60 @@
+"""
+Member search.
+
+On PostgreSQL the search runs against a trigram GIN index (pg_trgm) over an accent-insensitive,
+lower-cased expression of the member's names, DNI and number, so "gonzalez" finds "González"
+and results are ranked by word similarity. Other databases (SQLite in tests) fall back to
+plain LIKE over the same columns.
+
+The expression must stay identical to the one indexed by migration 7c3f2b9e1a58.
+"""
+import unicodedata
+
+from sqlalchemy import func, literal, literal_column, or_
+from sqlalchemy.orm import Query
+
+from . import models
+
+
+def normalize_search_term(term: str) -> str:
+    """Lower-cases and strips accents, the same way f_unaccent(lower(...)) does in the database."""
+    decomposed = unicodedata.normalize("NFKD", term.strip().lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def member_search_expression():
+    # Literal separators (not bound parameters) so the SQL matches the index expression exactly
+    space, empty = literal_column("' '"), literal_column("''")
+    return func.f_unaccent(func.lower(
+        models.Member.first_name.op("||")(space).op("||")(models.Member.last_name).op("||")(space)
+        .op("||")(func.coalesce(models.Member.dni, empty)).op("||")(space)
+        .op("||")(func.coalesce(models.Member.member_number, empty))
+    ))
+
+
+def apply_member_search(query: Query, search: str, dialect_name: str):
+    """
+    Filters `query` by `search`. Returns (query, rank) where rank is an expression to order by
+    (best match first), or None when the database has no similarity ranking.
+    """
+    term = normalize_search_term(search)
+    if not term:
+        return query, None
+
+    if dialect_name != "postgresql":
+        like_term = f"%{search.strip()}%"
+        return query.filter(or_(
+            models.Member.first_name.ilike(like_term),
+            models.Member.last_name.ilike(like_term),
+            models.Member.dni.ilike(like_term),
+            models.Member.member_number.ilike(like_term)
+        )), None
+
+    search_expression = member_search_expression()
+    # Both operators are served by the gin_trgm_ops index:
+    # LIKE for substrings (e.g. part of a DNI), <% for fuzzy word matches (typos, partial names)
+    query = query.filter(or_(
+        search_expression.like(f"%{term}%"),
+        literal(term).op("<%")(search_expression)
+    ))
+    return query, func.word_similarity(term, search_expression).desc()
@@ -1,17 +1,30 @@
 import enum
 from sqlalchemy import (
-    Boolean, Column, ForeignKey, Integer, String, Enum as SQLAlchemyEnum, Date, Numeric, Table, Float, DateTime
+    BigInteger, Boolean, Column, ForeignKey, Integer, String, Enum as SQLAlchemyEnum, Date, Numeric, Table, Float, DateTime,
+    UniqueConstraint, Index, func, text
 )
 from sqlalchemy.orm import relationship
 
 from .database import Base
 
+class ChangeTracked:
+    """
+    Creation and last change of club data, for incremental backups and delta sync. A trigger
+    sets updated_at on every UPDATE and change_seq, the id of the writing transaction, on every
+    INSERT and UPDATE (raw SQL ones included); hard deletes leave a DeletedRow.
+    """
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    change_seq = Column(BigInteger, nullable=False, server_default="0", index=True)
+
 # Association Table for Member <-> Activity
 member_activity_association = Table(
     "member_activity",
     Base.metadata,
     Column("member_id", Integer, ForeignKey("members.id"), primary_key=True),
     Column("activity_id", Integer, ForeignKey("activities.id"), primary_key=True),
+    # The primary key covers lookups by member; this one covers the members of an activity
+    Index("ix_member_activity_activity_id", "activity_id"),
 )
 
 class Club(Base):
@@ -43,10 +56,12 @@ class User(Base):
     # New fields for password recovery and forced change
     recovery_email = Column(String, nullable=True)
     force_password_change = Column(Boolean, default=False)
-    password_reset_token = Column(String, nullable=True)
+    password_reset_selector = Column(String, unique=True, index=True, nullable=True) # Looks up the reset token
+    password_reset_token = Column(String, nullable=True) # Keyed hash of the reset token's verifier
     password_reset_expires = Column(DateTime, nullable=True)
+    tokens_valid_after = Column(DateTime(timezone=True), nullable=True, index=True) # Claims of access tokens issued up to then are not trusted
 
-class Activity(Base):
+class Activity(ChangeTracked, Base):
     __tablename__ = "activities"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -70,8 +85,14 @@ class MemberTypeEnum(str, enum.Enum):
     DEPORTIVO = "Deportivo"
     NA = "N/A"
 
-class Member(Base):
+class Member(ChangeTracked, Base):
     __tablename__ = "members"
+    __table_args__ = (
+        # Members listing: club + active, ordered by last name
+        Index("ix_members_club_id_is_active_last_name", "club_id", "is_active", "last_name"),
+        # Active members sorted by DNI
+        Index("ix_members_active_club_id_dni", "club_id", "dni", postgresql_where=text("is_active = true")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, index=True, nullable=False)
@@ -82,7 +103,7 @@ class Member(Base):
     birth_date = Column(Date, nullable=True)
     is_active = Column(Boolean, default=True)
     member_type = Column(String(10), nullable=False, default=MemberTypeEnum.NA.value)
-    member_number = Column(String, nullable=True)
+    member_number = Column(String, index=True, nullable=True)
 
     club_id = Column(Integer, ForeignKey("clubs.id"))
     club = relationship("Club", back_populates="members")
@@ -94,8 +115,48 @@ class Member(Base):
         back_populates="members"
     )
     debts = relationship("Debt", back_populates="member", cascade="all, delete-orphan")
+    balance = relationship("MemberBalance", back_populates="member", uselist=False, cascade="all, delete-orphan")
+
+class MemberBalance(Base):
+    """
+    Persisted account balance of a member, updated in the same transaction as debt generation,
+    manual charges and payments (see backend/balances.py).
+    """
+    __tablename__ = "member_balances"
+    __table_args__ = (
+        # "Members with debt" lookups per club
+        Index("ix_member_balances_club_id_with_debt", "club_id", postgresql_where=text("outstanding > 0")),
+    )
+
+    member_id = Column(Integer, ForeignKey("members.id"), primary_key=True)
+    club_id = Column(Integer, ForeignKey("clubs.id"), nullable=False)
+    total_billed = Column(Numeric(12, 2), nullable=False, default=0)
+    total_paid = Column(Numeric(12, 2), nullable=False, default=0)
+    outstanding = Column(Numeric(12, 2), nullable=False, default=0)
+    oldest_unpaid_month = Column(Date, nullable=True)
+
+    member = relationship("Member", back_populates="balance")
+
+class CheckIn(Base):
+    """Check-in log (turnstile / front desk). Written in batches by backend/checkin.py."""
+    __tablename__ = "check_ins"
+    __table_args__ = (
+        # Check-in history of a club, most recent first
+        Index("ix_check_ins_club_id_checked_in_at", "club_id", "checked_in_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    checked_in_at = Column(DateTime(timezone=True), nullable=False)
+    code = Column(String, nullable=False) # As scanned: member number or DNI
+    allowed = Column(Boolean, nullable=False)
+    reason = Column(String(20), nullable=False)
 
-class Payment(Base):
+    club_id = Column(Integer, ForeignKey("clubs.id"), nullable=False)
+    member_id = Column(Integer, ForeignKey("members.id"), index=True, nullable=True) # Null when the code matched no member
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+class Payment(ChangeTracked, Base):
 
     __tablename__ = "payments"
 
@@ -113,16 +174,23 @@ class Payment(Base):
 
 
 
-    debt_id = Column(Integer, ForeignKey("debts.id"), nullable=False)
+    debt_id = Column(Integer, ForeignKey("debts.id"), index=True, nullable=False)
 
     debt = relationship("Debt", back_populates="payments")
 
-class Debt(Base):
+class Debt(ChangeTracked, Base):
     __tablename__ = "debts"
+    # One debt per member and month; monthly generation relies on it for ON CONFLICT DO NOTHING
+    __table_args__ = (
+        UniqueConstraint("member_id", "month", name="uq_debts_member_id_month"),
+        # Unpaid debts of a member, oldest first (payments, balances)
+        Index("ix_debts_unpaid_member_id_month", "member_id", "month", postgresql_where=text("is_paid = false")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     month = Column(Date, nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
+    paid_amount = Column(Numeric(10, 2), nullable=False, default=0, server_default="0") # Kept up to date by each payment
     is_paid = Column(Boolean, default=False, index=True)
 
     member_id = Column(Integer, ForeignKey("members.id"), nullable=False)
@@ -131,12 +199,16 @@ class Debt(Base):
     items = relationship("DebtItem", back_populates="debt", cascade="all, delete-orphan")
     payments = relationship("Payment", back_populates="debt")
 
+    @property
+    def remaining_amount(self):
+        return self.total_amount - (self.paid_amount or 0)
+
 # --- New Models for Club Finances ---
 class CategoryType(enum.Enum):
     INCOME = "income"
     EXPENSE = "expense"
 
-class Category(Base):
+class Category(ChangeTracked, Base):
     __tablename__ = "categories"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -148,8 +220,14 @@ class Category(Base):
 
     transactions = relationship("ClubTransaction", back_populates="category")
 
-class ClubTransaction(Base):
+class ClubTransaction(ChangeTracked, Base):
     __tablename__ = "club_transactions"
+    __table_args__ = (
+        # Transactions listing and date range filters, and its (transaction_date, id) keyset cursor
+        Index("ix_club_transactions_club_id_transaction_date_id", "club_id", "transaction_date", "id"),
+        # Balance by type and payment method
+        Index("ix_club_transactions_club_id_type_payment_method", "club_id", "type", "payment_method"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_date = Column(Date, nullable=False)
@@ -159,7 +237,7 @@ class ClubTransaction(Base):
     payment_method = Column(String, nullable=True)
     receipt_url = Column(String, nullable=True)
 
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True, nullable=True)
     category = relationship("Category", back_populates="transactions")
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -171,14 +249,80 @@ class ClubTransaction(Base):
     activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
     activity = relationship("Activity")
 
-class DebtItem(Base):
+class ClubMonthlySummary(Base):
+    """
+    Monthly rollup of club_transactions, one row per (club, month, type, category, activity, payment_method).
+    It is maintained by database triggers on club_transactions (see migration 8d21f5c7b3e6)
+    and can be rebuilt with `python -m backend.cli rebuild-summary`.
+    """
+    __tablename__ = "club_monthly_summary"
+    __table_args__ = (
+        UniqueConstraint(
+            "club_id", "month", "type", "category_id", "activity_id", "payment_method",
+            name="uq_club_monthly_summary_key", postgresql_nulls_not_distinct=True
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    month = Column(Date, nullable=False) # First day of the month
+    type = Column(SQLAlchemyEnum(CategoryType, name="category_type_enum", values_callable=lambda obj: [e.value for e in obj], native_enum=False), nullable=False)
+    payment_method = Column(String, nullable=True)
+    total_amount = Column(Numeric(14, 2), nullable=False, default=0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+
+    club_id = Column(Integer, ForeignKey("clubs.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    category = relationship("Category")
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
+    activity = relationship("Activity")
+
+class ClubDataVersion(Base):
+    """
+    Version of a club's data per scope, bumped by the writes of that scope.
+    The ETags of the cached read endpoints derive from it (see backend/data_versions.py).
+    """
+    __tablename__ = "club_data_versions"
+
+    club_id = Column(Integer, ForeignKey("clubs.id"), primary_key=True)
+    scope = Column(String(20), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class ClubSyncHorizon(Base):
+    """
+    Highest change_seq among a club's pruned tombstones: sync cursors at or below it may have
+    lost deletions (see backend/sync.py). Written by the prune-tombstones command.
+    """
+    __tablename__ = "club_sync_horizons"
+
+    club_id = Column(Integer, primary_key=True) # No foreign key, like DeletedRow.club_id
+    pruned_change_seq = Column(BigInteger, nullable=False)
+
+class DeletedRow(Base):
+    """
+    Tombstone of a hard-deleted row of a ChangeTracked table, written by a trigger.
+    Incremental backups export them as deletions (see backend/backup.py).
+    """
+    __tablename__ = "deleted_rows"
+    __table_args__ = (
+        Index("ix_deleted_rows_club_id_deleted_at", "club_id", "deleted_at"),
+        Index("ix_deleted_rows_club_id_change_seq", "club_id", "change_seq"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    club_id = Column(Integer, nullable=True) # No foreign key, like the row it stood for; null if its club could not be resolved
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    change_seq = Column(BigInteger, nullable=False, server_default=text("CAST(CAST(pg_current_xact_id() AS TEXT) AS BIGINT)"))
+
+class DebtItem(ChangeTracked, Base):
     __tablename__ = "debt_items"
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String, nullable=False)
     amount = Column(Numeric(10, 2), nullable=False)
     
-    debt_id = Column(Integer, ForeignKey("debts.id"), nullable=False)
+    debt_id = Column(Integer, ForeignKey("debts.id"), index=True, nullable=False)
     debt = relationship("Debt", back_populates="items")
 
     activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
@@ -0,0 +1,124 @@
+"""
+Argon2 password hashing off the request path.
+
+Hashes and verifications run in a small dedicated process pool, so a burst of logins can
+neither block the event loop nor starve the request threads. At most
+PASSWORD_HASH_MAX_PENDING operations may be queued or running; beyond that new ones are
+rejected at once with PasswordHashingBusy (the routers answer 503) instead of piling up.
+
+Argon2 parameters come from ARGON2_TIME_COST / ARGON2_MEMORY_COST / ARGON2_PARALLELISM
+(passlib's defaults when unset). `python -m backend.cli calibrate-hashing` picks them for a
+target latency on the host. Hashes made with other parameters keep verifying and are
+replaced on the next successful login (see check_and_update_password).
+
+This module must stay importable without the database: the pool workers import it.
+"""
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(2, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 8))
+
+
+def _argon2_settings() -> dict:
+    settings = {}
+    for name in ("time_cost", "memory_cost", "parallelism"):
+        value = os.getenv(f"ARGON2_{name.upper()}")
+        if value:
+            settings[f"argon2__{name}"] = int(value)
+    return settings
+
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **_argon2_settings())
+
+
+class PasswordHashingBusy(Exception):
+    """Too many hash operations pending; the caller should retry later."""
+
+
+# --- Work done inside the pool processes ---
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+def check_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHashingPool:
+    """A lazily started process pool with a bound on pending operations."""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs threads (uvicorn, DB pool) is not safe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        """Queues `fn(*args)` or raises PasswordHashingBusy when the pool is saturated."""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+hashing_pool = PasswordHashingPool()
+
+
+def calibrate(target_ms: float, memory_cost: int = 65536, parallelism: int = 1, samples: int = 5) -> dict:
+    """
+    Finds argon2 parameters whose hash takes about `target_ms` on this host (median of `samples`).
+    Keeps `memory_cost` (KiB) unless a single pass is already too slow, in which case memory is halved
+    down to 8 MiB; then raises time_cost while the hash stays within the target.
+    """
+    def measure(time_cost, memory):
+        context = CryptContext(schemes=["argon2"], argon2__time_cost=time_cost, argon2__memory_cost=memory, argon2__parallelism=parallelism)
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            context.hash("calibration-password")
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    time_cost = 1
+    elapsed_ms = measure(time_cost, memory_cost)
+    while elapsed_ms > target_ms and memory_cost > 8192:
+        memory_cost //= 2
+        elapsed_ms = measure(time_cost, memory_cost)
+
+    while True:
+        next_ms = measure(time_cost + 1, memory_cost)
+        if next_ms > target_ms:
+            break
+        time_cost, elapsed_ms = time_cost + 1, next_ms
+
+    return {"time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism, "elapsed_ms": elapsed_ms}
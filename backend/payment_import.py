@@ -0,0 +1,183 @@
+"""
+Bulk payment import from payment collector / bank settlement CSV files.
+
+Expected columns (header names are case-insensitive):
+    dni or member_number, amount, payment_date (YYYY-MM-DD), payment_method (optional)
+
+The file is read as a stream and processed in chunks: each chunk resolves its members with
+one indexed lookup, loads and locks their unpaid debts with one query, allocates every row
+in memory and writes payments, debt updates, club transactions and balances with one bulk
+statement each. Rows that cannot be imported are reported and skipped.
+"""
+import csv
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from types import SimpleNamespace
+from typing import IO, Dict, Iterator, List, Optional
+
+from sqlalchemy import insert, update, or_
+from sqlalchemy.orm import Session, selectinload
+
+from . import models
+from .balances import apply_balance_deltas
+from .payments import get_or_create_payment_categories, plan_member_payment
+
+IMPORT_CHUNK_SIZE = 1000
+
+
+def _chunks(rows: Iterator, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _find_members(db: Session, club_id: int, rows: List[dict]) -> tuple:
+    """Resolves the members of a chunk with one query. Returns (by_dni, by_number) lookups."""
+    dnis = {row["dni"] for row in rows if row["dni"]}
+    numbers = {row["member_number"] for row in rows if row["member_number"]}
+    if not dnis and not numbers:
+        return {}, {}
+
+    members = db.query(models.Member).filter(
+        models.Member.club_id == club_id,
+        or_(models.Member.dni.in_(dnis), models.Member.member_number.in_(numbers))
+    ).all()
+
+    by_dni, by_number = defaultdict(list), defaultdict(list)
+    for member in members:
+        if member.dni in dnis:
+            by_dni[member.dni].append(member)
+        if member.member_number in numbers:
+            by_number[member.member_number].append(member)
+    return by_dni, by_number
+
+
+def _load_unpaid_debts(db: Session, member_ids: set) -> Dict[int, list]:
+    """
+    Unpaid debts of the chunk's members, locked until commit. They are copied into plain
+    objects so that paid amounts can move row by row without dirtying the session.
+    """
+    debts = db.query(models.Debt).options(selectinload(models.Debt.items)).filter(
+        models.Debt.member_id.in_(member_ids),
+        models.Debt.is_paid == False
+    ).order_by(models.Debt.month, models.Debt.id).with_for_update().populate_existing().all()
+
+    debts_by_member = defaultdict(list)
+    for debt in debts:
+        debts_by_member[debt.member_id].append(SimpleNamespace(
+            id=debt.id, month=debt.month, total_amount=debt.total_amount,
+            paid_amount=debt.paid_amount or Decimal('0.00'), items=list(debt.items)
+        ))
+    return debts_by_member
+
+
+def _parse_row(line_number: int, raw: dict) -> dict:
+    row = {key.strip().lower(): (value or "").strip() for key, value in raw.items() if key}
+    return {
+        "row": line_number,
+        "dni": row.get("dni") or None,
+        "member_number": row.get("member_number") or None,
+        "amount": row.get("amount", ""),
+        "payment_date": row.get("payment_date", ""),
+        "payment_method": row.get("payment_method") or None,
+    }
+
+
+def import_payments(
+    db: Session,
+    csv_file: IO[str],
+    user: models.User,
+    default_payment_method: Optional[str] = None,
+    delimiter: str = ","
+) -> List[dict]:
+    """
+    Imports the payments of `csv_file` for the user's club. Nothing is committed; the caller
+    commits once, so the accepted rows are written all together. Returns one result per row.
+    """
+    club_id = user.club_id
+    categories = get_or_create_payment_categories(db, club_id)
+    reader = csv.DictReader(csv_file, delimiter=delimiter)
+    # Line 1 is the header
+    parsed_rows = (_parse_row(line_number, raw) for line_number, raw in enumerate(reader, start=2))
+
+    results = []
+    for chunk in _chunks(parsed_rows, IMPORT_CHUNK_SIZE):
+        by_dni, by_number = _find_members(db, club_id, chunk)
+        matched = {}
+        for row in chunk:
+            candidates = by_dni.get(row["dni"]) if row["dni"] else by_number.get(row["member_number"])
+            if candidates and len(candidates) == 1:
+                matched[row["row"]] = candidates[0]
+        debts_by_member = _load_unpaid_debts(db, {member.id for member in matched.values()}) if matched else {}
+
+        payment_rows, transactions = [], []
+        paid_by_member = defaultdict(lambda: Decimal('0.00'))
+        for row in chunk:
+            result = {"row": row["row"], "dni": row["dni"], "member_number": row["member_number"], "member_id": None}
+            results.append(result)
+
+            if not row["dni"] and not row["member_number"]:
+                result.update(status="error", detail="Missing dni or member_number")
+                continue
+            member = matched.get(row["row"])
+            if not member:
+                candidates = by_dni.get(row["dni"]) if row["dni"] else by_number.get(row["member_number"])
+                result.update(status="error", detail="Ambiguous member" if candidates else "Member not found")
+                continue
+            result["member_id"] = member.id
+
+            try:
+                amount = Decimal(row["amount"].replace(",", "."))
+                if not amount.is_finite(): # NaN and Infinity parse, but cannot be compared or stored
+                    raise InvalidOperation
+                payment_date = datetime.strptime(row["payment_date"], "%Y-%m-%d").date()
+            except (InvalidOperation, ValueError):
+                result.update(status="error", detail="Invalid amount or payment_date (use YYYY-MM-DD)")
+                continue
+            if amount.normalize().as_tuple().exponent < -2: # Not rounded away by the database
+                result.update(status="error", detail="Payment amount cannot have more than 2 decimals")
+                continue
+            if amount <= 0:
+                result.update(status="error", detail="Payment amount must be positive")
+                continue
+
+            debts = debts_by_member.get(member.id, [])
+            outstanding = sum((debt.total_amount - debt.paid_amount for debt in debts), Decimal('0.00'))
+            if amount > outstanding:
+                result.update(status="error", detail=f"Payment amount exceeds the outstanding balance ({outstanding})")
+                continue
+
+            row_payments, row_transactions, breakdown = plan_member_payment(
+                debts, amount, member, payment_date, row["payment_method"] or default_payment_method,
+                None, user.id, club_id, categories
+            )
+            payment_rows.extend(row_payments)
+            transactions.extend(row_transactions)
+            paid_by_member[member.id] += amount
+
+            # Following rows of the same member see this payment
+            paid_by_debt = {item["debt_id"]: item["paid_amount"] for item in breakdown}
+            for debt in debts:
+                debt.paid_amount = paid_by_debt.get(debt.id, debt.paid_amount)
+
+            result.update(status="ok", detail=None, amount=float(amount), debts_paid=len(breakdown))
+
+        if payment_rows:
+            db.execute(insert(models.Payment), payment_rows)
+            touched_debts = {debt.id: debt for debts in debts_by_member.values() for debt in debts}
+            db.execute(update(models.Debt), [
+                {"id": debt_id, "paid_amount": touched_debts[debt_id].paid_amount,
+                 "is_paid": touched_debts[debt_id].paid_amount >= touched_debts[debt_id].total_amount}
+                for debt_id in {row["debt_id"] for row in payment_rows}
+            ])
+        if transactions:
+            db.execute(insert(models.ClubTransaction), transactions)
+        apply_balance_deltas(db, paid_by_member)
+
+    return results
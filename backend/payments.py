@@ -0,0 +1,246 @@
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session, selectinload
+
+from . import models
+from .allocation import Allocation, allocate_payment, spread_over_debts
+from .balances import apply_balance_delta
+from .data_versions import bump_data_version, REFERENCE
+from .reference_cache import CategoryRef, reference_cache
+
+SOCIAL_FEE_CATEGORY_NAME = "Cuota de Socio"
+ACTIVITY_INCOME_CATEGORY_NAME = "Ingreso por Actividades"
+
+
+def get_or_create_payment_categories(db: Session, club_id: int) -> Tuple[CategoryRef, CategoryRef]:
+    """
+    Gets or creates the default categories for social fees and activity income.
+    They normally come from the club's reference data cache, without any query.
+    New categories are only flushed, so they are committed with the rest of the payment.
+    """
+    reference = reference_cache.get(db, club_id)
+    social_fee_category = reference.category(SOCIAL_FEE_CATEGORY_NAME, models.CategoryType.INCOME)
+    activity_income_category = reference.category(ACTIVITY_INCOME_CATEGORY_NAME, models.CategoryType.INCOME)
+    if social_fee_category and activity_income_category:
+        return social_fee_category, activity_income_category
+
+    categories = db.query(models.Category).filter(
+        models.Category.club_id == club_id,
+        models.Category.name.in_([SOCIAL_FEE_CATEGORY_NAME, ACTIVITY_INCOME_CATEGORY_NAME]),
+        models.Category.type == models.CategoryType.INCOME
+    ).all()
+    by_name = {category.name: category for category in categories}
+
+    created = False
+    for name in (SOCIAL_FEE_CATEGORY_NAME, ACTIVITY_INCOME_CATEGORY_NAME):
+        if name not in by_name:
+            by_name[name] = models.Category(name=name, type=models.CategoryType.INCOME, club_id=club_id)
+            db.add(by_name[name])
+            created = True
+    db.flush()
+    if created:
+        bump_data_version(db, club_id, REFERENCE) # Refreshes the cached reference data on commit
+
+    return by_name[SOCIAL_FEE_CATEGORY_NAME], by_name[ACTIVITY_INCOME_CATEGORY_NAME]
+
+
+def add_to_debt_paid_amount(db: Session, debt_id: int, amount: Decimal) -> Decimal:
+    """
+    Atomically adds `amount` to the debt's paid_amount and derives is_paid in the same statement.
+    Concurrent payments on the same debt are serialized by the row lock.
+    Returns the amount that was paid before this one.
+    """
+    total_paid_after_current = db.execute(
+        update(models.Debt)
+        .where(models.Debt.id == debt_id)
+        .values(
+            paid_amount=models.Debt.paid_amount + amount,
+            is_paid=models.Debt.paid_amount + amount >= models.Debt.total_amount
+        )
+        .returning(models.Debt.paid_amount)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    return total_paid_after_current - amount
+
+
+def add_to_debt_total_amount(db: Session, debt_id: int, amount: Decimal) -> Decimal:
+    """
+    Atomically adds a charge of `amount` to the debt's total_amount and derives is_paid in the
+    same statement, against the paid_amount of concurrent payments. Returns the new total.
+    """
+    return db.execute(
+        update(models.Debt)
+        .where(models.Debt.id == debt_id)
+        .values(
+            total_amount=models.Debt.total_amount + amount,
+            is_paid=models.Debt.paid_amount >= models.Debt.total_amount + amount
+        )
+        .returning(models.Debt.total_amount)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+
+def build_club_transactions(
+    allocations: List[Allocation],
+    member: Optional[models.Member],
+    payment_date: date,
+    payment_method: Optional[str],
+    receipt_url: Optional[str],
+    user_id: int,
+    club_id: int,
+    categories: Tuple[CategoryRef, CategoryRef]
+) -> List[dict]:
+    """Builds one income club transaction row per allocated debt item, ready for a bulk insert."""
+    social_fee_category, activity_income_category = categories
+    member_name = f"{member.first_name} {member.last_name}" if member else ""
+    return [
+        {
+            "transaction_date": payment_date,
+            "description": f"Pago {allocation.item.description} - {member_name}".strip(),
+            "amount": allocation.amount,
+            "type": models.CategoryType.INCOME,
+            "payment_method": payment_method,
+            "category_id": social_fee_category.id if allocation.item.activity_id is None else activity_income_category.id,
+            "activity_id": allocation.item.activity_id,
+            "receipt_url": receipt_url,
+            "user_id": user_id,
+            "club_id": club_id,
+        }
+        for allocation in allocations
+    ]
+
+
+def record_payment(
+    db: Session,
+    debt: models.Debt,
+    amount: Decimal,
+    payment_date: date,
+    payment_method: Optional[str],
+    receipt_url: Optional[str],
+    user: models.User
+) -> models.Payment:
+    """
+    Records a payment for a debt as a single unit of work: the payment, the debt's paid amount,
+    the club transactions of the allocated items and the member balance.
+    Nothing is committed; the caller commits once.
+    """
+    db_payment = models.Payment(
+        amount=amount,
+        payment_date=payment_date,
+        payment_method=payment_method,
+        debt_id=debt.id,
+        receipt_url=receipt_url
+    )
+    db.add(db_payment)
+
+    previously_paid = add_to_debt_paid_amount(db, debt.id, amount)
+    allocations = allocate_payment(debt.items, previously_paid, amount)
+
+    if allocations:
+        categories = get_or_create_payment_categories(db, user.club_id)
+        transactions = build_club_transactions(
+            allocations, debt.member, payment_date, payment_method, receipt_url, user.id, user.club_id, categories
+        )
+        db.execute(insert(models.ClubTransaction), transactions)
+
+    apply_balance_delta(db, debt.member_id, paid=amount)
+    return db_payment
+
+
+def get_unpaid_debts_for_update(db: Session, member_id: int) -> List[models.Debt]:
+    """Unpaid debts of a member, oldest first, locked until the end of the transaction."""
+    return db.query(models.Debt).options(selectinload(models.Debt.items)).filter(
+        models.Debt.member_id == member_id,
+        models.Debt.is_paid == False
+    ).order_by(models.Debt.month, models.Debt.id).with_for_update().all()
+
+
+def plan_member_payment(
+    debts: List,
+    amount: Decimal,
+    member: Optional[models.Member],
+    payment_date: date,
+    payment_method: Optional[str],
+    receipt_url: Optional[str],
+    user_id: int,
+    club_id: int,
+    categories: Tuple[CategoryRef, CategoryRef]
+) -> Tuple[List[dict], List[dict], List[dict]]:
+    """
+    Spreads one payment over `debts` (oldest first) and the items of each debt, without touching
+    the database. Returns the payment rows, the club transaction rows and the per-debt breakdown
+    (aligned with the payment rows), ready for bulk statements.
+    """
+    payment_rows = []
+    transactions = []
+    breakdown = []
+    for allocation in spread_over_debts(debts, amount):
+        debt = allocation.item
+        previously_paid = debt.paid_amount or 0
+        item_allocations = allocate_payment(debt.items, previously_paid, allocation.amount)
+        transactions.extend(build_club_transactions(
+            item_allocations, member, payment_date, payment_method, receipt_url, user_id, club_id, categories
+        ))
+        payment_rows.append({
+            "amount": allocation.amount,
+            "payment_date": payment_date,
+            "payment_method": payment_method,
+            "debt_id": debt.id,
+            "receipt_url": receipt_url,
+        })
+        paid_amount = previously_paid + allocation.amount
+        breakdown.append({
+            "debt_id": debt.id,
+            "month": debt.month,
+            "amount": allocation.amount,
+            "paid_amount": paid_amount,
+            "remaining_amount": debt.total_amount - paid_amount,
+            "is_paid": paid_amount >= debt.total_amount,
+        })
+    return payment_rows, transactions, breakdown
+
+
+def record_member_payment(
+    db: Session,
+    member: models.Member,
+    debts: List[models.Debt],
+    amount: Decimal,
+    payment_date: date,
+    payment_method: Optional[str],
+    receipt_url: Optional[str],
+    user: models.User
+) -> List[dict]:
+    """
+    Spreads one payment over the given unpaid debts of a member (oldest first), reusing the
+    item-level allocation rules for each debt. Payments, debt updates and club transactions
+    are written with one bulk statement each. `debts` must come from get_unpaid_debts_for_update.
+    Nothing is committed; the caller commits once. Returns the per-debt breakdown.
+    """
+    categories = get_or_create_payment_categories(db, user.club_id)
+    payment_rows, transactions, breakdown = plan_member_payment(
+        debts, amount, member, payment_date, payment_method, receipt_url, user.id, user.club_id, categories
+    )
+    if not payment_rows:
+        return []
+
+    payment_ids = db.execute(
+        insert(models.Payment).returning(models.Payment.id, sort_by_parameter_order=True),
+        payment_rows
+    ).scalars().all()
+    for item, payment_id in zip(breakdown, payment_ids):
+        item["payment_id"] = payment_id
+
+    # The debts are locked, so their paid amounts can be set from the values loaded with them
+    db.execute(update(models.Debt), [
+        {"id": item["debt_id"], "paid_amount": item["paid_amount"], "is_paid": item["is_paid"]}
+        for item in breakdown
+    ])
+
+    if transactions:
+        db.execute(insert(models.ClubTransaction), transactions)
+
+    apply_balance_delta(db, member.id, paid=sum(row["amount"] for row in payment_rows))
+    return breakdown
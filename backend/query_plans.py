@@ -0,0 +1,78 @@
+"""
+EXPLAIN ANALYZE of the routers' hot queries, to compare plans before and after index changes.
+
+Usage:
+    python -m backend.cli explain-queries --club-id 3 > before.txt
+    alembic -c backend/alembic.ini upgrade head
+    python -m backend.cli explain-queries --club-id 3 > after.txt
+    diff before.txt after.txt
+
+Every statement runs inside a transaction that is rolled back.
+"""
+from typing import Iterator, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# (router, description, query). Parameters: :club_id, :member_id, :debt_id, :activity_id, :category_id
+HOT_QUERIES = [
+    ("members", "GET /members page ordered by last name",
+     "SELECT * FROM members WHERE club_id = :club_id AND is_active = true ORDER BY last_name LIMIT 10 OFFSET 0"),
+    ("members", "GET /members total",
+     "SELECT COUNT(*) FROM members WHERE club_id = :club_id AND is_active = true"),
+    ("members", "GET /members?sort_by=dni",
+     "SELECT * FROM members WHERE club_id = :club_id AND is_active = true ORDER BY dni LIMIT 10"),
+    ("members", "GET /members?activity_id=",
+     "SELECT members.* FROM members JOIN member_activity ma ON ma.member_id = members.id "
+     "WHERE members.club_id = :club_id AND members.is_active = true AND ma.activity_id = :activity_id "
+     "ORDER BY members.last_name LIMIT 10"),
+    ("members", "GET /members/{id}/debts/",
+     "SELECT * FROM debts WHERE member_id = :member_id ORDER BY month DESC"),
+    ("debts", "unpaid debts of a member (member payments, imports)",
+     "SELECT * FROM debts WHERE member_id = :member_id AND is_paid = false ORDER BY month, id"),
+    ("debts", "debt of a member for a month (manual charges)",
+     "SELECT * FROM debts WHERE member_id = :member_id AND month = date_trunc('month', now())::date"),
+    ("debts", "payments of a debt",
+     "SELECT * FROM payments WHERE debt_id = :debt_id"),
+    ("debts", "items of a debt",
+     "SELECT * FROM debt_items WHERE debt_id = :debt_id"),
+    ("transactions", "GET /transactions page",
+     "SELECT * FROM club_transactions WHERE club_id = :club_id ORDER BY transaction_date DESC, id DESC LIMIT 10 OFFSET 0"),
+    ("transactions", "GET /transactions?cursor= keyset page",
+     "SELECT * FROM club_transactions WHERE club_id = :club_id "
+     "AND (transaction_date, id) < (now()::date - 365, 2147483647) "
+     "ORDER BY transaction_date DESC, id DESC LIMIT 10"),
+    ("transactions", "GET /transactions date range",
+     "SELECT * FROM club_transactions WHERE club_id = :club_id "
+     "AND transaction_date >= now()::date - 90 AND transaction_date <= now()::date "
+     "ORDER BY transaction_date DESC LIMIT 10"),
+    ("transactions", "balance by type and payment method",
+     "SELECT type, payment_method, SUM(amount) FROM club_transactions WHERE club_id = :club_id "
+     "GROUP BY type, payment_method"),
+    ("categories", "DELETE /categories/{id} linked transactions check",
+     "SELECT id FROM club_transactions WHERE category_id = :category_id LIMIT 1"),
+    ("reports", "GET /reports/income-vs-expenses/{year} (rollup)",
+     "SELECT month, type, SUM(total_amount) FROM club_monthly_summary WHERE club_id = :club_id "
+     "AND month >= date_trunc('year', now())::date GROUP BY month, type"),
+]
+
+SAMPLE_IDS_SQL = text("""
+SELECT (SELECT id FROM members WHERE club_id = :club_id ORDER BY id LIMIT 1) AS member_id,
+       (SELECT d.id FROM debts d JOIN members m ON m.id = d.member_id WHERE m.club_id = :club_id ORDER BY d.id LIMIT 1) AS debt_id,
+       (SELECT id FROM activities WHERE club_id = :club_id ORDER BY id LIMIT 1) AS activity_id,
+       (SELECT id FROM categories WHERE club_id = :club_id ORDER BY id LIMIT 1) AS category_id
+""")
+
+
+def explain_hot_queries(db: Session, club_id: int, router: Optional[str] = None) -> Iterator[Tuple[str, str, str]]:
+    """Yields (router, description, plan) for each hot query, using sample ids of the club."""
+    params = dict(db.execute(SAMPLE_IDS_SQL, {"club_id": club_id}).one()._mapping)
+    params["club_id"] = club_id
+    try:
+        for query_router, description, query in HOT_QUERIES:
+            if router and query_router != router:
+                continue
+            rows = db.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), params).scalars().all()
+            yield query_router, description, "\n".join(rows)
+    finally:
+        db.rollback()
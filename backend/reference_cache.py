@@ -0,0 +1,136 @@
+"""
+In-process cache of club reference data: club settings, activities (cost and profesor),
+categories by id and by (name, type), and the club's profesor ids.
+
+Entries are plain immutable snapshots, safe to share between request threads, and are kept
+for the REFERENCE_CACHE_MAX_CLUBS most recently used clubs. Each one remembers the club's
+"reference" data version (see backend/data_versions.py):
+- bumps, from this or any other process, drop the entry as soon as they are committed
+  (invalidation bus, backend/invalidation.py);
+- as a safety net should an event be lost, the version is also re-read at most every
+  REFERENCE_CACHE_CHECK_SECONDS per club.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .data_versions import REFERENCE, get_data_versions
+from .invalidation import subscribe
+
+REFERENCE_CACHE_MAX_CLUBS = int(os.getenv("REFERENCE_CACHE_MAX_CLUBS", 256))
+REFERENCE_CACHE_CHECK_SECONDS = float(os.getenv("REFERENCE_CACHE_CHECK_SECONDS", 5))
+
+
+class ClubSettings(NamedTuple):
+    id: int
+    name: str
+    base_fee: Optional[float]
+    email_domain: Optional[str]
+    is_active: bool
+
+
+class ActivityRef(NamedTuple):
+    id: int
+    name: str
+    monthly_cost: Decimal
+    profesor_id: Optional[int]
+
+
+class CategoryRef(NamedTuple):
+    id: int
+    name: str
+    type: models.CategoryType
+
+
+class ClubReferenceData(NamedTuple):
+    version: int
+    club: Optional[ClubSettings]
+    activities: Dict[int, ActivityRef]
+    categories: Dict[int, CategoryRef]
+    categories_by_name: Dict[Tuple[str, models.CategoryType], CategoryRef]
+    profesor_ids: FrozenSet[int]
+
+    def category(self, name: str, type: models.CategoryType) -> Optional[CategoryRef]:
+        return self.categories_by_name.get((name, type))
+
+    def activity_ids_of_profesor(self, profesor_id: int) -> FrozenSet[int]:
+        return frozenset(activity.id for activity in self.activities.values() if activity.profesor_id == profesor_id)
+
+
+def load_club_reference_data(db: Session, club_id: int) -> ClubReferenceData:
+    version = get_data_versions(db, club_id, [REFERENCE])[REFERENCE]
+    club = db.query(models.Club).filter(models.Club.id == club_id).first()
+    activities = db.query(
+        models.Activity.id, models.Activity.name, models.Activity.monthly_cost, models.Activity.profesor_id
+    ).filter(models.Activity.club_id == club_id).all()
+    categories = db.query(
+        models.Category.id, models.Category.name, models.Category.type
+    ).filter(models.Category.club_id == club_id).order_by(models.Category.id).all()
+    profesor_ids = db.query(models.User.id).filter(
+        models.User.club_id == club_id,
+        models.User.role == 'profesor'
+    ).all()
+
+    category_refs = {row.id: CategoryRef(*row) for row in categories}
+    categories_by_name = {}
+    for category in category_refs.values():
+        categories_by_name.setdefault((category.name, category.type), category) # Oldest one wins, like .first()
+    return ClubReferenceData(
+        version=version,
+        club=ClubSettings(club.id, club.name, club.base_fee, club.email_domain, bool(club.is_active)) if club else None,
+        activities={row.id: ActivityRef(*row) for row in activities},
+        categories=category_refs,
+        categories_by_name=categories_by_name,
+        profesor_ids=frozenset(profesor_id for profesor_id, in profesor_ids)
+    )
+
+
+class ReferenceDataCache:
+    def __init__(self, max_clubs: int = REFERENCE_CACHE_MAX_CLUBS, check_seconds: float = REFERENCE_CACHE_CHECK_SECONDS):
+        self.max_clubs = max_clubs
+        self.check_seconds = check_seconds
+        self._entries: "OrderedDict[int, list]" = OrderedDict() # club_id -> [data, checked_at]
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, club_id: int) -> ClubReferenceData:
+        with self._lock:
+            entry = self._entries.get(club_id)
+            if entry is not None:
+                self._entries.move_to_end(club_id)
+        if entry is not None:
+            data, checked_at = entry
+            if time.monotonic() - checked_at < self.check_seconds:
+                return data
+            if get_data_versions(db, club_id, [REFERENCE])[REFERENCE] == data.version:
+                entry[1] = time.monotonic()
+                return data
+
+        data = load_club_reference_data(db, club_id)
+        with self._lock:
+            self._entries[club_id] = [data, time.monotonic()]
+            self._entries.move_to_end(club_id)
+            while len(self._entries) > self.max_clubs:
+                self._entries.popitem(last=False)
+        return data
+
+    def invalidate(self, club_id: Optional[int]):
+        """Drops a club's entry, or every entry when club_id is None."""
+        with self._lock:
+            if club_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(club_id, None)
+
+
+reference_cache = ReferenceDataCache()
+
+
+@subscribe(REFERENCE)
+def _invalidate_reference_data(club_id, keys):
+    reference_cache.invalidate(club_id)
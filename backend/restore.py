@@ -0,0 +1,188 @@
+"""
+Club restore from a backup archive (backend/backup.py), PostgreSQL only.
+
+The whole restore is a handful of set-based statements in one transaction:
+1. every CSV is loaded with COPY FROM into a temporary staging table shaped like its table;
+2. each staging table with an `id` gets a key map (old id -> nextval of the table's sequence);
+3. the club's current data is deleted;
+4. one INSERT ... SELECT per table writes the staged rows with their new ids, joining the key
+   maps to rewrite the foreign keys (member_id, debt_id, category_id, activity_id, user_id, ...)
+   and setting club_id to the target club, and updated_at to now (every id changed, so the
+   next incremental backup must include them all);
+5. balances are recomputed, and the monthly summary is maintained by its triggers.
+
+Readers keep seeing the old data until the commit, and a failure leaves it untouched. The
+caller owns the transaction and must commit.
+"""
+import csv
+import io
+import json
+import zipfile
+from typing import Dict, List
+
+from sqlalchemy import Table, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .backup import BACKUP_TABLES
+from .balances import repair_member_balances
+from .data_versions import bump_data_version, FINANCE, MEMBERS, REFERENCE
+from .invalidation import publish, ALL
+
+# Current data of a club, children first. Deleting its transactions also empties its
+# monthly summary (statement triggers); the DELETE on club_monthly_summary is a safety net.
+DELETE_CLUB_DATA_SQL = [
+    text("DELETE FROM check_ins WHERE club_id = :club_id"),
+    text("DELETE FROM club_transactions WHERE club_id = :club_id"),
+    text("DELETE FROM club_monthly_summary WHERE club_id = :club_id"),
+    text("""
+        DELETE FROM payments WHERE debt_id IN (
+            SELECT d.id FROM debts d JOIN members m ON m.id = d.member_id WHERE m.club_id = :club_id
+        )
+    """),
+    text("""
+        DELETE FROM debt_items WHERE debt_id IN (
+            SELECT d.id FROM debts d JOIN members m ON m.id = d.member_id WHERE m.club_id = :club_id
+        )
+    """),
+    text("DELETE FROM debts WHERE member_id IN (SELECT id FROM members WHERE club_id = :club_id)"),
+    text("DELETE FROM member_activity WHERE member_id IN (SELECT id FROM members WHERE club_id = :club_id)"),
+    text("DELETE FROM member_balances WHERE club_id = :club_id"),
+    text("DELETE FROM members WHERE club_id = :club_id"),
+    text("DELETE FROM activities WHERE club_id = :club_id"),
+    text("DELETE FROM categories WHERE club_id = :club_id"),
+    text("DELETE FROM users WHERE club_id = :club_id"),
+]
+
+
+def staging_table(table: Table) -> str:
+    return f"restore_{table.name}"
+
+
+def key_map_table(table: Table) -> str:
+    return f"restore_map_{table.name}"
+
+
+def has_key_map(table: Table) -> bool:
+    return [column.name for column in table.primary_key.columns] == ["id"]
+
+
+def read_csv_header(archive: zipfile.ZipFile, name: str, table: Table) -> List[str]:
+    with archive.open(name) as entry:
+        header = next(csv.reader(io.TextIOWrapper(entry, encoding="utf-8", newline="")), [])
+    unknown = [column for column in header if column not in table.c]
+    if unknown:
+        raise ValueError(f"{name} has unknown columns: {', '.join(unknown)}")
+    if has_key_map(table) and "id" not in header:
+        raise ValueError(f"{name} has no id column")
+    return header
+
+
+def copy_csv(db: Session, archive: zipfile.ZipFile, name: str, staging: str, columns: List[str]):
+    """COPY FROM of a CSV entry into a staging table, over the session's own connection."""
+    quote = db.get_bind().dialect.identifier_preparer.quote
+    cursor = db.connection().connection.cursor()
+    try:
+        with archive.open(name) as entry:
+            cursor.copy_expert(
+                f"COPY {staging} ({', '.join(quote(column) for column in columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                entry
+            )
+    except db.get_bind().dialect.dbapi.DataError as e: # Raised by the driver itself, not wrapped by SQLAlchemy
+        raise ValueError(f"{name}: {e}")
+    finally:
+        cursor.close()
+
+
+def insert_from_staging_sql(db: Session, table: Table, columns: List[str]) -> str:
+    """INSERT ... SELECT of a staging table, with its keys and foreign keys rewritten through the key maps."""
+    quote = db.get_bind().dialect.identifier_preparer.quote
+    select_list, joins = [], []
+    for column_name in columns:
+        column = table.c[column_name]
+        foreign_key = next(iter(column.foreign_keys), None)
+        if column_name == "updated_at":
+            select_list.append("now()")
+        elif column_name == "id" and has_key_map(table):
+            select_list.append("k.new_id")
+            joins.append(f"JOIN {key_map_table(table)} k ON k.old_id = s.id")
+        elif foreign_key is not None and foreign_key.column.table.name == "clubs":
+            select_list.append(":club_id")
+        elif foreign_key is not None:
+            alias = f"fk{len(joins)}"
+            select_list.append(f"{alias}.new_id")
+            joins.append(
+                f"LEFT JOIN {key_map_table(foreign_key.column.table)} {alias} ON {alias}.old_id = s.{quote(column_name)}"
+            )
+        else:
+            select_list.append(f"s.{quote(column_name)}")
+    return (
+        f"INSERT INTO {table.name} ({', '.join(quote(column) for column in columns)}) "
+        f"SELECT {', '.join(select_list)} FROM {staging_table(table)} s {' '.join(joins)}"
+    )
+
+
+def restore_club(db: Session, club_id: int, archive: zipfile.ZipFile) -> Dict[str, int]:
+    """
+    Replaces all the data of an existing club with the contents of a full backup archive
+    (its manifest.json has no `since`).
+    Returns the number of rows restored per table. Raises ValueError for invalid archives
+    (including any holding a superadmin user); rows that break a constraint (e.g. a user
+    email taken by another club) raise IntegrityError.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise ValueError("Restoring a backup requires PostgreSQL.")
+    if db.execute(text("SELECT id FROM clubs WHERE id = :club_id FOR UPDATE"), {"club_id": club_id}).first() is None:
+        raise ValueError(f"Club {club_id} does not exist.")
+
+    names = set(archive.namelist())
+    if "manifest.json" not in names:
+        raise ValueError("The archive has no manifest.json.")
+    try:
+        manifest = json.loads(archive.read("manifest.json"))
+    except ValueError:
+        manifest = None
+    if not isinstance(manifest, dict) or "since" not in manifest:
+        raise ValueError("Invalid manifest.json.")
+    # Not deleted_rows.csv: incremental backups without deletions have none
+    if manifest["since"] is not None:
+        raise ValueError("This is an incremental backup; restore a full one.")
+
+    columns_by_table = {}
+    for table in BACKUP_TABLES:
+        name = f"{table.name}.csv"
+        # Empty tables have no file in the archive: they get an empty staging table
+        columns_by_table[table.name] = read_csv_header(archive, name, table) if name in names else [c.name for c in table.c]
+        db.execute(text(f"CREATE TEMP TABLE {staging_table(table)} ON COMMIT DROP AS SELECT * FROM {table.name} WITH NO DATA"))
+        if name in names:
+            copy_csv(db, archive, name, staging_table(table), columns_by_table[table.name])
+        db.execute(text(f"ANALYZE {staging_table(table)}")) # Temp tables are never auto-analyzed
+
+    # Superadmins belong to no club, so no backup holds one: such a row was planted to escalate
+    if db.execute(text(f"SELECT 1 FROM {staging_table(models.User.__table__)} WHERE role = 'superadmin' LIMIT 1")).first():
+        raise ValueError("users.csv contains superadmin users.")
+
+    for table in BACKUP_TABLES:
+        if has_key_map(table):
+            db.execute(text(f"""
+                CREATE TEMP TABLE {key_map_table(table)} ON COMMIT DROP AS
+                SELECT id AS old_id, nextval(pg_get_serial_sequence('{table.name}', 'id')) AS new_id
+                FROM {staging_table(table)}
+            """))
+            db.execute(text(f"ALTER TABLE {key_map_table(table)} ADD PRIMARY KEY (old_id)"))
+            db.execute(text(f"ANALYZE {key_map_table(table)}"))
+
+    for statement in DELETE_CLUB_DATA_SQL:
+        db.execute(statement, {"club_id": club_id})
+
+    restored = {}
+    for table in BACKUP_TABLES:
+        insert_sql = insert_from_staging_sql(db, table, columns_by_table[table.name])
+        restored[table.name] = db.execute(text(insert_sql), {"club_id": club_id}).rowcount
+
+    # Every user id changed: the uid claims of their access tokens can no longer be trusted
+    db.execute(text("UPDATE users SET tokens_valid_after = now() WHERE club_id = :club_id"), {"club_id": club_id})
+    repair_member_balances(db, club_id=club_id)
+    bump_data_version(db, club_id, REFERENCE, FINANCE, MEMBERS)
+    publish(db, club_id, ALL) # Users, members and ids all changed
+    return restored
@@ -3,9 +3,12 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 import os # For frontend URL from environment
 
-from .. import models, schemas, security
+from .. import models, schemas
 from ..database import get_db
-from ..security import get_current_user, verify_password, get_password_hash, create_reset_token
+from ..security import (
+    get_current_db_user, verify_password, get_password_hash, invalidate_principals,
+    create_password_reset_token, split_password_reset_token, verify_reset_verifier
+)
 # from ..email_service import send_email_async # Import the async email sender
 from ..email_service import email_service
 
@@ -18,7 +21,7 @@ router = APIRouter(
 def change_password(
     password_data: schemas.PasswordChange,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_db_user)
 ):
     """
     Allows a logged-in user to change their password.
@@ -44,10 +47,12 @@ def change_password(
     current_user.force_password_change = False # Password changed, no longer forced
 
     # Clear any reset tokens if they exist (password was changed via normal means)
+    current_user.password_reset_selector = None
     current_user.password_reset_token = None
     current_user.password_reset_expires = None
 
     db.add(current_user)
+    invalidate_principals(db, current_user.email)
     db.commit()
     db.refresh(current_user)
 
@@ -78,11 +83,13 @@ async def request_password_reset(
         )
 
     # Generate token and set expiry
-    token_plain = create_reset_token()
-    user.password_reset_token = security.get_password_hash(token_plain) # Store hashed token
+    token_plain, selector, verifier_hash = create_password_reset_token()
+    user.password_reset_selector = selector
+    user.password_reset_token = verifier_hash # Only the keyed hash of the verifier is stored
     user.password_reset_expires = datetime.utcnow() + timedelta(hours=1) # Token valid for 1 hour
     
     db.add(user)
+    invalidate_principals(db, user.email)
     db.commit()
     db.refresh(user)
 
@@ -124,14 +131,14 @@ def reset_password(
     """
     Resets the user's password using a valid reset token.
     """
-    # Find user by hashed token
-    # Note: We store the hash of the token, so we need to iterate and verify
-    users_with_tokens = db.query(models.User).filter(models.User.password_reset_token.isnot(None)).all()
+    # Find the user by the token's selector (indexed), then check its verifier in constant time
     user = None
-    for u in users_with_tokens:
-        if security.verify_password(password_data.token, u.password_reset_token): # Verify plain token against stored hash
-            user = u
-            break
+    token_parts = split_password_reset_token(password_data.token)
+    if token_parts:
+        selector, verifier = token_parts
+        user = db.query(models.User).filter(models.User.password_reset_selector == selector).first()
+        if user and not verify_reset_verifier(verifier, user.password_reset_token):
+            user = None
 
     if not user:
         raise HTTPException(
@@ -142,9 +149,11 @@ def reset_password(
     # Check token expiry
     if user.password_reset_expires < datetime.utcnow():
         # Invalidate token
+        user.password_reset_selector = None
         user.password_reset_token = None
         user.password_reset_expires = None
         db.add(user)
+        invalidate_principals(db, user.email)
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -157,10 +166,12 @@ def reset_password(
     user.force_password_change = False # Password changed via reset, no longer forced
 
     # Invalidate token after use
+    user.password_reset_selector = None
     user.password_reset_token = None
     user.password_reset_expires = None
 
     db.add(user)
+    invalidate_principals(db, user.email)
     db.commit()
     db.refresh(user)
 
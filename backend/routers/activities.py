@@ -1,23 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session
 from typing import List
 
 from .. import models, schemas
 from ..database import get_db
 from ..security import require_roles, get_current_user
+from ..loading import response_loader_options
+from ..reference_cache import reference_cache
+from ..data_versions import bump_data_version, conditional_get, MEMBERS, REFERENCE
 
 router = APIRouter(
     prefix="/activities",
     tags=["activities"],
 )
 
-@router.get("/", response_model=List[schemas.Activity], dependencies=[Depends(require_roles(['admin', 'profesor']))])
+@router.get("/", response_model=List[schemas.Activity], dependencies=[Depends(require_roles(['admin', 'profesor'])), Depends(conditional_get(REFERENCE))])
 def get_activities(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     """
     Get all activities for the current user's club.
     Accessible by admin and profesor.
     """
-    return db.query(models.Activity).options(selectinload(models.Activity.profesor)).filter(models.Activity.club_id == current_user.club_id).all()
+    return db.query(models.Activity).options(
+        *response_loader_options(models.Activity, schemas.Activity)
+    ).filter(models.Activity.club_id == current_user.club_id).all()
 
 @router.post("/", response_model=schemas.Activity, status_code=201, dependencies=[Depends(require_roles(['admin']))])
 def create_activity(activity: schemas.ActivityCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
@@ -25,16 +30,12 @@ def create_activity(activity: schemas.ActivityCreate, db: Session = Depends(get_
     Create a new activity for the current user's club (Admin only).
     """
     if activity.profesor_id:
-        profesor = db.query(models.User).filter(
-            models.User.id == activity.profesor_id,
-            models.User.club_id == current_user.club_id,
-            models.User.role == 'profesor'
-        ).first()
-        if not profesor:
+        if activity.profesor_id not in reference_cache.get(db, current_user.club_id).profesor_ids:
             raise HTTPException(status_code=400, detail=f"Profesor with id {activity.profesor_id} not found or invalid role.")
 
     db_activity = models.Activity(**activity.model_dump(), club_id=current_user.club_id)
     db.add(db_activity)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     db.refresh(db_activity)
     return db_activity
@@ -54,18 +55,14 @@ def update_activity(activity_id: int, activity_in: schemas.ActivityCreate, db: S
     update_data = activity_in.model_dump(exclude_unset=True)
 
     if 'profesor_id' in update_data and update_data['profesor_id'] is not None:
-        profesor = db.query(models.User).filter(
-            models.User.id == update_data['profesor_id'],
-            models.User.club_id == current_user.club_id,
-            models.User.role == 'profesor'
-        ).first()
-        if not profesor:
+        if update_data['profesor_id'] not in reference_cache.get(db, current_user.club_id).profesor_ids:
             raise HTTPException(status_code=400, detail=f"Profesor with id {update_data['profesor_id']} not found or invalid role.")
 
     for key, value in update_data.items():
         setattr(db_activity, key, value)
     
     db.add(db_activity)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     db.refresh(db_activity)
     return db_activity
@@ -81,5 +78,6 @@ def delete_activity(activity_id: int, db: Session = Depends(get_db), current_use
     ).first()
     if db_activity:
         db.delete(db_activity)
+        bump_data_version(db, current_user.club_id, REFERENCE, MEMBERS)
         db.commit()
     return
@@ -6,7 +6,7 @@ import os
 
 from .. import schemas, models
 from ..database import get_db
-from ..security import verify_password, create_access_token, create_refresh_token
+from ..security import verify_and_update_password, create_access_token, create_refresh_token, access_token_claims
 # Note: schemas.TokenResponseWithForceChange and schemas.RefreshTokenRequest need to be defined in the new schemas.py
 from ..schemas import TokenResponseWithForceChange, RefreshTokenRequest
 
@@ -22,14 +22,19 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Incorrect email or password, or user is inactive",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = verify_and_update_password(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored with outdated argon2 parameters: upgrade it now that we have the plain password
+        user.hashed_password = new_hash
+        db.commit()
     
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=access_token_claims(user))
     refresh_token = create_refresh_token(data={"sub": user.email})
 
     return {
@@ -63,7 +68,7 @@ def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get
     if user is None or not user.is_active:
         raise credentials_exception
         
-    new_access_token = create_access_token(data={"sub": user.email})
+    new_access_token = create_access_token(data=access_token_claims(user))
     new_refresh_token = create_refresh_token(data={"sub": user.email})
     
     return {
@@ -5,6 +5,7 @@ from typing import List
 from .. import models, schemas
 from ..database import get_db
 from ..security import require_roles, get_current_user
+from ..data_versions import bump_data_version, conditional_get, REFERENCE
 
 router = APIRouter(
     prefix="/categories",
@@ -35,11 +36,12 @@ def create_category(
         club_id=current_user.club_id
     )
     db.add(db_category)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     db.refresh(db_category)
     return db_category
 
-@router.get("/", response_model=List[schemas.Category])
+@router.get("/", response_model=List[schemas.Category], dependencies=[Depends(conditional_get(REFERENCE))])
 def read_categories(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -90,6 +92,7 @@ def update_category(
         setattr(db_category, key, value)
     
     db.add(db_category)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     db.refresh(db_category)
     return db_category
@@ -118,5 +121,6 @@ def delete_category(
         raise HTTPException(status_code=400, detail="Cannot delete category: it is linked to existing transactions.")
 
     db.delete(db_category)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     return
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import get_db
+from ..security import require_roles, get_current_user
+from ..checkin import check_in, check_in_log
+
+router = APIRouter(
+    prefix="/checkin",
+    tags=["checkin"],
+    dependencies=[Depends(require_roles(['admin', 'tesorero', 'comision', 'profesor']))],
+)
+
+@router.post("", response_model=schemas.CheckInResult)
+def check_in_member(
+    request: schemas.CheckInRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Validates a scanned member number or DNI: is the member active, enrolled in the
+    activity (if one is given) and up to date with their payments?
+    Answered from the club's in-memory access index; every check-in is logged.
+    """
+    if not request.code.strip():
+        raise HTTPException(status_code=400, detail="Code is required.")
+
+    decision = check_in(db, current_user.club_id, request.code, request.activity_id)
+    check_in_log.log(current_user.club_id, request.code, decision, request.activity_id, current_user.id)
+
+    member = decision.member
+    if member is None:
+        return schemas.CheckInResult(allowed=decision.allowed, reason=decision.reason)
+    return schemas.CheckInResult(
+        allowed=decision.allowed,
+        reason=decision.reason,
+        member_id=member.member_id,
+        first_name=member.first_name,
+        last_name=member.last_name,
+        outstanding=member.outstanding,
+        oldest_unpaid_month=member.oldest_unpaid_month
+    )
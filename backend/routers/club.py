@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..database import get_db
 from ..security import require_roles, get_current_user
+from ..data_versions import bump_data_version, conditional_get, REFERENCE
 
 router = APIRouter(
     prefix="/club",
@@ -11,7 +12,7 @@ router = APIRouter(
     dependencies=[Depends(require_roles(['admin']))],
 )
 
-@router.get("/settings", response_model=schemas.Club)
+@router.get("/settings", response_model=schemas.Club, dependencies=[Depends(conditional_get(REFERENCE))])
 def get_club_settings(
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user)
@@ -35,6 +36,7 @@ def update_club_settings(
     db_club.base_fee = club_in.base_fee
     
     db.add(db_club)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     db.refresh(db_club)
     return db_club
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session, selectinload, contains_eager
 from typing import List, Optional
+import csv
+import io
 import os
 import uuid
 from datetime import datetime
@@ -9,6 +11,12 @@ from decimal import Decimal
 from .. import models, schemas
 from ..database import get_db
 from ..security import get_current_user, require_roles
+from ..billing import generate_monthly_debts
+from ..balances import apply_balance_delta
+from ..payments import record_payment, record_member_payment, get_unpaid_debts_for_update, add_to_debt_total_amount
+from ..payment_import import import_payments
+from ..data_versions import bump_data_version, FINANCE
+from ..reference_cache import reference_cache
 
 router = APIRouter(
     tags=["debts"],
@@ -27,8 +35,12 @@ def create_payment_for_debt(
     """
     Create a payment for a specific debt, correctly allocating the payment across
     debt items and creating corresponding, correctly categorized club transactions.
+    The allocation rules live in backend/allocation.py and the writes in backend/payments.py.
     """
-    db_debt = db.query(models.Debt).options(selectinload(models.Debt.payments)).join(models.Member).filter(
+    db_debt = db.query(models.Debt).join(models.Member).options(
+        contains_eager(models.Debt.member),
+        selectinload(models.Debt.items)
+    ).filter(
         models.Debt.id == debt_id,
         models.Member.club_id == current_user.club_id
     ).first()
@@ -45,9 +57,6 @@ def create_payment_for_debt(
     if payment_amount <= 0:
         raise HTTPException(status_code=400, detail="Payment amount must be positive.")
 
-    # --- Calculate amounts paid before this new payment ---
-    total_previously_paid = sum(p.amount for p in db_debt.payments)
-
     # --- Handle Receipt Upload ---
     receipt_url = None
     if receipt:
@@ -60,103 +69,112 @@ def create_payment_for_debt(
             file_object.write(receipt.file.read())
         receipt_url = file_location
 
-    # --- Create and Save the Payment ---
-    db_payment = models.Payment(
-        amount=payment_amount,
-        payment_date=parsed_payment_date,
-        payment_method=payment_method,
-        debt_id=debt_id,
-        receipt_url=receipt_url
+    # --- Record the payment, its allocation and club transactions in one transaction ---
+    db_payment = record_payment(
+        db, db_debt, payment_amount, parsed_payment_date, payment_method, receipt_url, current_user
     )
-    db.add(db_payment)
+    bump_data_version(db, current_user.club_id, FINANCE)
     db.commit()
     db.refresh(db_payment)
+    return db_payment
 
-    # --- Update Debt Paid Status ---
-    db.refresh(db_debt)
-    total_paid_after_current = sum(p.amount for p in db_debt.payments)
-    db_debt.is_paid = total_paid_after_current >= db_debt.total_amount
-    db.add(db_debt)
+@router.post("/members/{member_id}/payments/", response_model=schemas.MemberPaymentResult, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
+def create_payment_for_member(
+    member_id: int,
+    payment_date: str = Form(...),
+    amount: float = Form(...),
+    payment_method: Optional[str] = Form(None),
+    receipt: Optional[UploadFile] = File(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Pay a member's outstanding balance: one amount is spread over all of the member's unpaid
+    debts, oldest first, and allocated to the items of each debt like a single-debt payment.
+    Everything is written in a single transaction.
+    """
+    db_member = db.query(models.Member).filter(
+        models.Member.id == member_id,
+        models.Member.club_id == current_user.club_id
+    ).first()
+    if not db_member:
+        raise HTTPException(status_code=404, detail="Member not found in this club")
 
-    # --- Payment Allocation and Club Transaction Creation ---
-    db_member = db.query(models.Member).filter(models.Member.id == db_debt.member_id).first()
-    sorted_items = sorted(db_debt.items, key=lambda x: x.activity_id is not None)
-    
-    remaining_current_payment = payment_amount
-    outstanding_debt_tracker = total_previously_paid
+    try:
+        parsed_payment_date = datetime.strptime(payment_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
-    # Get or create categories
-    social_fee_category, activity_income_category = get_or_create_payment_categories(db, current_user.club_id)
+    payment_amount = Decimal(str(amount))
+    if payment_amount <= 0:
+        raise HTTPException(status_code=400, detail="Payment amount must be positive.")
 
-    for item in sorted_items:
-        if remaining_current_payment <= 0:
-            break
+    unpaid_debts = get_unpaid_debts_for_update(db, member_id)
+    total_outstanding = sum((debt.total_amount - debt.paid_amount for debt in unpaid_debts), Decimal('0.00'))
+    if total_outstanding <= 0:
+        raise HTTPException(status_code=400, detail="Member has no outstanding debt.")
+    if payment_amount > total_outstanding:
+        raise HTTPException(status_code=400, detail=f"Payment amount exceeds the outstanding balance ({total_outstanding}).")
 
-        already_covered = max(Decimal(0), outstanding_debt_tracker)
-        item_outstanding = item.amount - already_covered
-        
-        if item_outstanding <= 0:
-            outstanding_debt_tracker -= item.amount
-            continue
+    # --- Handle Receipt Upload ---
+    receipt_url = None
+    if receipt:
+        upload_dir = "uploads/receipts"
+        os.makedirs(upload_dir, exist_ok=True)
+        file_extension = receipt.filename.split(".")[-1]
+        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        file_location = os.path.join(upload_dir, unique_filename)
+        with open(file_location, "wb+") as file_object:
+            file_object.write(receipt.file.read())
+        receipt_url = file_location
 
-        amount_to_allocate = min(remaining_current_payment, item_outstanding)
+    breakdown = record_member_payment(
+        db, db_member, unpaid_debts, payment_amount, parsed_payment_date, payment_method, receipt_url, current_user
+    )
+    bump_data_version(db, current_user.club_id, FINANCE)
+    db.commit()
 
-        if amount_to_allocate > 0:
-            member_name = f"{db_member.first_name} {db_member.last_name}" if db_member else ""
-            transaction_description = f"Pago {item.description} - {member_name}".strip()
-            
-            # Determine correct category
-            category_id_to_use = social_fee_category.id if item.activity_id is None else activity_income_category.id
+    return schemas.MemberPaymentResult(
+        items=breakdown,
+        total_allocated=payment_amount,
+        outstanding_after=total_outstanding - payment_amount
+    )
 
-            new_club_transaction = models.ClubTransaction(
-                transaction_date=parsed_payment_date,
-                description=transaction_description,
-                amount=amount_to_allocate,
-                type=models.CategoryType.INCOME,
-                payment_method=payment_method,
-                category_id=category_id_to_use,
-                activity_id=item.activity_id,
-                receipt_url=receipt_url,
-                user_id=current_user.id,
-                club_id=current_user.club_id
-            )
-            db.add(new_club_transaction)
-            remaining_current_payment -= amount_to_allocate
-        
-        outstanding_debt_tracker -= item.amount
+@router.post("/payments/import", response_model=schemas.PaymentImportResult, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
+def import_payments_csv(
+    file: UploadFile = File(...),
+    payment_method: Optional[str] = Form(None),
+    delimiter: str = Form(","),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Import a payment collector / bank settlement CSV file (dni or member_number, amount,
+    payment_date and an optional payment_method per row). Each row is allocated against the
+    member's unpaid debts, oldest first. Invalid rows are reported and skipped; the valid
+    ones are written in a single transaction.
+    """
+    if len(delimiter) != 1:
+        raise HTTPException(status_code=400, detail="Delimiter must be a single character.")
 
+    csv_stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        results = import_payments(db, csv_stream, current_user, default_payment_method=payment_method, delimiter=delimiter)
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid CSV file: {e}")
+    bump_data_version(db, current_user.club_id, FINANCE)
     db.commit()
-    return db_payment
-
-def get_or_create_payment_categories(db: Session, club_id: int):
-    """Gets or creates the default categories for social fees and activity income."""
-    # For Social Fee
-    social_fee_category = db.query(models.Category).filter(
-        models.Category.club_id == club_id,
-        models.Category.name == "Cuota de Socio",
-        models.Category.type == models.CategoryType.INCOME
-    ).first()
-    if not social_fee_category:
-        social_fee_category = models.Category(name="Cuota de Socio", type=models.CategoryType.INCOME, club_id=club_id)
-        db.add(social_fee_category)
-        db.commit()
-        db.refresh(social_fee_category)
 
-    # For Activity Income
-    activity_income_category = db.query(models.Category).filter(
-        models.Category.club_id == club_id,
-        models.Category.name == "Ingreso por Actividades",
-        models.Category.type == models.CategoryType.INCOME
-    ).first()
-    if not activity_income_category:
-        activity_income_category = models.Category(name="Ingreso por Actividades", type=models.CategoryType.INCOME, club_id=club_id)
-        db.add(activity_income_category)
-        db.commit()
-        db.refresh(activity_income_category)
-        
-    return social_fee_category, activity_income_category
+    imported = [row for row in results if row["status"] == "ok"]
+    return schemas.PaymentImportResult(
+        imported=len(imported),
+        failed=len(results) - len(imported),
+        total_amount=sum(row["amount"] for row in imported),
+        rows=results
+    )
 
-@router.post("/generate-monthly-debt", status_code=200, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
+@router.post("/generate-monthly-debt", status_code=200, response_model=schemas.DebtGenerationResult, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
 def generate_monthly_debt(
     request: schemas.DebtGenerationRequest,
     db: Session = Depends(get_db),
@@ -165,8 +183,9 @@ def generate_monthly_debt(
     """
     Generates the monthly debt for all active members of a club.
     It's no longer mandatory for the club to have a base_fee.
+    Members that already have a debt for the month are skipped, so it is safe to run it again.
     """
-    db_club = db.query(models.Club).filter(models.Club.id == current_user.club_id).first()
+    db_club = reference_cache.get(db, current_user.club_id).club
     if not db_club:
         raise HTTPException(status_code=404, detail="Club not found.")
 
@@ -175,57 +194,15 @@ def generate_monthly_debt(
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de mes inválido. Use AAAA-MM.")
 
-    members = db.query(models.Member).options(selectinload(models.Member.activities)).filter(
-        models.Member.club_id == current_user.club_id,
-        models.Member.is_active == True
-    ).all()
-
-    generated_count = 0
-    for member in members:
-        existing_debt = db.query(models.Debt).filter(
-            models.Debt.member_id == member.id,
-            models.Debt.month == month_date
-        ).first()
-        if existing_debt:
-            continue
-
-        debt_items = []
-        total_amount = Decimal('0.00')
-
-        # Add base fee only if it exists and is greater than 0
-        if db_club.base_fee and db_club.base_fee > 0:
-            base_fee_decimal = Decimal(str(db_club.base_fee))
-            debt_items.append(models.DebtItem(
-                description="Cuota Social", 
-                amount=base_fee_decimal,
-                activity_id=None # Explicitly set as None for base fee
-            ))
-            total_amount += base_fee_decimal
-
-        # Add activity fees
-        for activity in member.activities:
-            activity_cost_decimal = Decimal(str(activity.monthly_cost))
-            debt_items.append(models.DebtItem(
-                description=f"Actividad: {activity.name}", 
-                amount=activity_cost_decimal,
-                activity_id=activity.id # Link the debt item to the activity
-            ))
-            total_amount += activity_cost_decimal
-        
-        if total_amount > 0:
-            new_debt = models.Debt(
-                month=month_date,
-                total_amount=total_amount,
-                is_paid=False,
-                member_id=member.id,
-                items=debt_items
-            )
-            db.add(new_debt)
-            generated_count += 1
-
+    generated_count, skipped_count = generate_monthly_debts(db, db_club, month_date)
+    bump_data_version(db, current_user.club_id, FINANCE)
     db.commit()
-    
-    return {"message": f"Deuda generada con éxito para {generated_count} socios."}
+
+    return {
+        "message": f"Deuda generada con éxito para {generated_count} socios.",
+        "generated": generated_count,
+        "skipped": skipped_count
+    }
 
 @router.post("/debts/manual", response_model=schemas.Debt)
 def create_manual_charge(
@@ -249,10 +226,7 @@ def create_manual_charge(
     if current_user.role not in ['admin', 'tesorero']:
         if current_user.role == 'profesor':
             # Check if the member is a student of the professor
-            professor_activities = db.query(models.Activity.id).filter(
-                models.Activity.profesor_id == current_user.id
-            ).all()
-            professor_activity_ids = {activity_id for activity_id, in professor_activities}
+            professor_activity_ids = reference_cache.get(db, current_user.club_id).activity_ids_of_profesor(current_user.id)
 
             member_activities = {activity.id for activity in member.activities}
             
@@ -286,8 +260,7 @@ def create_manual_charge(
             activity_id=None
         )
         db.add(new_debt_item)
-        db_debt.total_amount += charge_amount
-        db.add(db_debt)
+        add_to_debt_total_amount(db, db_debt.id, charge_amount)
     else:
         # Debt does not exist, create a new one
         new_debt = models.Debt(
@@ -305,7 +278,9 @@ def create_manual_charge(
         )
         db.add(new_debt)
         db_debt = new_debt
-    
+
+    apply_balance_delta(db, charge_data.member_id, billed=charge_amount)
+    bump_data_version(db, current_user.club_id, FINANCE)
     db.commit()
     db.refresh(db_debt)
     
@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import or_
 from typing import List, Optional
+import csv
+import io
 
 from .. import models, schemas
 from ..database import get_db
 from ..security import get_current_user, require_roles
+from ..member_import import import_members
+from ..loading import response_loader_options
+from ..member_search import apply_member_search
+from ..data_versions import bump_data_version, MEMBERS
 
 router = APIRouter(
     prefix="/members",
     tags=["members"],
 )
 
+def load_member_for_response(db: Session, member_id: int) -> models.Member:
+    """Reloads a member with everything schemas.Member serializes, in a fixed number of queries."""
+    return db.query(models.Member).options(
+        *response_loader_options(models.Member, schemas.Member)
+    ).filter(models.Member.id == member_id).populate_existing().first()
+
 @router.get("", response_model=schemas.MemberPage)
 def get_all_members(
     db: Session = Depends(get_db),
@@ -20,11 +31,12 @@ def get_all_members(
     size: int = 10,
     search: Optional[str] = None,
     activity_id: Optional[int] = None,
+    with_debt: Optional[bool] = None,
     sort_by: Optional[str] = None
 ):
     """
     Get a paginated list of active members for the current user's club.
-    Can be filtered by a search term, activity, and sorted.
+    Can be filtered by a search term, activity, outstanding debt, and sorted.
     """
     query = db.query(models.Member).filter(
         models.Member.club_id == current_user.club_id,
@@ -43,28 +55,67 @@ def get_all_members(
             models.Activity.id == activity_id
         )
 
-    # Filter by search term if provided
+    # Filter by outstanding balance if requested
+    if with_debt:
+        query = query.join(models.Member.balance).filter(models.MemberBalance.outstanding > 0)
+
+    # Filter by search term if provided (trigram index on PostgreSQL, ranked by similarity)
+    search_rank = None
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                models.Member.first_name.ilike(search_term),
-                models.Member.last_name.ilike(search_term),
-                models.Member.dni.ilike(search_term)
-            )
-        )
+        query, search_rank = apply_member_search(query, search, db.get_bind().dialect.name)
 
     # Sort the results
     if sort_by == 'dni':
         query = query.order_by(models.Member.dni)
+    elif search_rank is not None: # Best matches first when searching
+        query = query.order_by(search_rank, models.Member.last_name)
     else: # Default sort by last name
         query = query.order_by(models.Member.last_name)
 
 
     total = query.count()
-    items = query.offset((page - 1) * size).limit(size).all()
+    # Activities, their profesor and its club are loaded with one query per level, not per member
+    items = query.options(
+        *response_loader_options(models.Member, schemas.Member)
+    ).offset((page - 1) * size).limit(size).all()
     return {"items": items, "total": total}
 
+@router.get("/typeahead", response_model=List[schemas.MemberTypeaheadItem])
+def search_members_typeahead(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Lightweight member search for the search box: only id, names, DNI and member number
+    of the best matching active members of the club.
+    """
+    if len(q.strip()) < 2:
+        return []
+
+    query = db.query(
+        models.Member.id,
+        models.Member.first_name,
+        models.Member.last_name,
+        models.Member.dni,
+        models.Member.member_number
+    ).filter(
+        models.Member.club_id == current_user.club_id,
+        models.Member.is_active == True
+    )
+
+    # If the user is a professor, only show their students
+    if current_user.role == 'profesor':
+        query = query.filter(models.Member.activities.any(models.Activity.profesor_id == current_user.id))
+
+    query, search_rank = apply_member_search(query, q, db.get_bind().dialect.name)
+    if search_rank is not None:
+        query = query.order_by(search_rank)
+    query = query.order_by(models.Member.last_name)
+
+    return query.limit(limit).all()
+
 @router.post("", response_model=schemas.Member, status_code=201, dependencies=[Depends(require_roles(['admin']))])
 def create_new_member(member_in: schemas.MemberCreate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     # Check for existing email if provided
@@ -78,9 +129,40 @@ def create_new_member(member_in: schemas.MemberCreate, db: Session = Depends(get
 
     db_member = models.Member(**member_in.model_dump(), club_id=current_user.club_id)
     db.add(db_member)
+    bump_data_version(db, current_user.club_id, MEMBERS)
     db.commit()
-    db.refresh(db_member)
-    return db_member
+    return load_member_for_response(db, db_member.id)
+
+@router.post("/import", response_model=schemas.MemberImportResult, dependencies=[Depends(require_roles(['admin']))])
+def import_members_csv(
+    file: UploadFile = File(...),
+    delimiter: str = Form(","),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Import or update members from a CSV file with the member fields and an optional
+    'activities' column (names or ids separated by '|'). Members are matched by DNI, or by
+    email when there is no DNI. Invalid rows are reported and skipped.
+    """
+    if len(delimiter) != 1:
+        raise HTTPException(status_code=400, detail="Delimiter must be a single character.")
+
+    csv_stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        results = import_members(db, csv_stream, current_user.club_id, delimiter=delimiter)
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid CSV file: {e}")
+    bump_data_version(db, current_user.club_id, MEMBERS)
+    db.commit()
+
+    return schemas.MemberImportResult(
+        created=sum(1 for row in results if row["status"] == "created"),
+        updated=sum(1 for row in results if row["status"] == "updated"),
+        failed=sum(1 for row in results if row["status"] == "error"),
+        rows=results
+    )
 
 @router.put("/{member_id}", response_model=schemas.Member, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
 def update_member(member_id: int, member_update: schemas.MemberUpdate, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
@@ -97,9 +179,9 @@ def update_member(member_id: int, member_update: schemas.MemberUpdate, db: Sessi
         setattr(db_member, key, value)
         
     db.add(db_member)
+    bump_data_version(db, current_user.club_id, MEMBERS)
     db.commit()
-    db.refresh(db_member)
-    return db_member
+    return load_member_for_response(db, member_id)
 
 @router.delete("/{member_id}", status_code=204, dependencies=[Depends(require_roles(['admin']))])
 def delete_member(member_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
@@ -111,6 +193,7 @@ def delete_member(member_id: int, db: Session = Depends(get_db), current_user: s
     if not db_member:
         return
     db_member.is_active = False
+    bump_data_version(db, current_user.club_id, MEMBERS)
     db.commit()
     return
 
@@ -139,9 +222,9 @@ def add_activity_to_member(
         raise HTTPException(status_code=400, detail="Member is already enrolled in this activity")
 
     db_member.activities.append(db_activity)
+    bump_data_version(db, current_user.club_id, MEMBERS)
     db.commit()
-    db.refresh(db_member)
-    return db_member
+    return load_member_for_response(db, member_id)
 
 @router.delete("/{member_id}/activities/{activity_id}", response_model=schemas.Member, dependencies=[Depends(require_roles(['admin', 'profesor']))])
 def remove_activity_from_member(
@@ -168,9 +251,9 @@ def remove_activity_from_member(
         raise HTTPException(status_code=400, detail="Member is not enrolled in this activity")
 
     db_member.activities.remove(db_activity)
+    bump_data_version(db, current_user.club_id, MEMBERS)
     db.commit()
-    db.refresh(db_member)
-    return db_member
+    return load_member_for_response(db, member_id)
 
 @router.get("/{member_id}/debts/", response_model=List[schemas.Debt])
 def get_debts_for_member(
@@ -195,6 +278,31 @@ def get_debts_for_member(
     
     return debts
 
+@router.get("/{member_id}/balance", response_model=schemas.MemberBalance)
+def get_member_balance(
+    member_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Get the persisted account balance of a member (total billed, total paid, outstanding).
+    """
+    db_balance = db.query(models.MemberBalance).filter(
+        models.MemberBalance.member_id == member_id,
+        models.MemberBalance.club_id == current_user.club_id
+    ).first()
+    if db_balance:
+        return db_balance
+
+    # Members without any debt have no balance row yet
+    db_member = db.query(models.Member).filter(
+        models.Member.id == member_id,
+        models.Member.club_id == current_user.club_id
+    ).first()
+    if not db_member:
+        raise HTTPException(status_code=404, detail="Member not found in this club")
+    return schemas.MemberBalance(member_id=member_id, total_billed=0, total_paid=0, outstanding=0)
+
 @router.get("/{member_id}/statement/", response_model=schemas.MemberStatement)
 def get_member_statement(
     member_id: int,
@@ -1,18 +1,20 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import func, case, extract, distinct
+from sqlalchemy import func, case, distinct
 from typing import Optional, List
 
 from .. import models, schemas
 from ..database import get_db
 from ..security import get_current_user, require_roles
+from ..summary import summary_period_filters
+from ..data_versions import conditional_get, FINANCE, MEMBERS, REFERENCE
 
 router = APIRouter(
     prefix="/reports",
     tags=["reports"],
 )
 
-@router.get("/my-students/account-status", response_model=schemas.ProfessorStudentReport, dependencies=[Depends(require_roles(['profesor']))])
+@router.get("/my-students/account-status", response_model=schemas.ProfessorStudentReport, dependencies=[Depends(require_roles(['profesor'])), Depends(conditional_get(FINANCE, MEMBERS, REFERENCE))])
 def get_professor_student_report(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -31,51 +33,26 @@ def get_professor_student_report(
     if not student_ids:
         return schemas.ProfessorStudentReport(students=[])
 
-    # 2. Get all member details for these students
-    students = db.query(models.Member).filter(models.Member.id.in_(student_ids)).all()
-    student_map = {s.id: s for s in students}
+    # 2. Get all member details for these students along with their persisted balance
+    students = db.query(models.Member, models.MemberBalance.outstanding).outerjoin(
+        models.MemberBalance, models.MemberBalance.member_id == models.Member.id
+    ).filter(models.Member.id.in_(student_ids)).all()
 
-    # 3. Get all debts for these students
-    debts = db.query(
-        models.Debt.member_id,
-        func.sum(models.Debt.total_amount).label('total_debt')
-    ).filter(
-        models.Debt.member_id.in_(student_ids)
-    ).group_by(models.Debt.member_id).all()
-    debt_map = {d.member_id: d.total_debt for d in debts}
-
-    # 4. Get all payments for these students
-    payments = db.query(
-        models.Debt.member_id,
-        func.sum(models.Payment.amount).label('total_paid')
-    ).join(
-        models.Payment, models.Debt.id == models.Payment.debt_id
-    ).filter(
-        models.Debt.member_id.in_(student_ids)
-    ).group_by(models.Debt.member_id).all()
-    payment_map = {p.member_id: p.total_paid for p in payments}
-
-    # 5. Build the report
+    # 3. Build the report
     report_items = []
-    for student_id in student_ids:
-        total_debt = debt_map.get(student_id, 0.0)
-        total_paid = payment_map.get(student_id, 0.0)
-        balance = float(total_debt) - float(total_paid)
-        
-        student = student_map.get(student_id)
-        if student:
-            report_items.append(schemas.StudentAccountStatus(
-                member_id=student.id,
-                first_name=student.first_name,
-                last_name=student.last_name,
-                dni=student.dni,
-                balance=balance
-            ))
+    for student, outstanding in students:
+        report_items.append(schemas.StudentAccountStatus(
+            member_id=student.id,
+            first_name=student.first_name,
+            last_name=student.last_name,
+            dni=student.dni,
+            balance=float(outstanding or 0)
+        ))
             
     return schemas.ProfessorStudentReport(students=report_items)
 
 
-@router.get("/income-by-activity", dependencies=[Depends(require_roles(['admin', 'tesorero']))])
+@router.get("/income-by-activity", dependencies=[Depends(require_roles(['admin', 'tesorero'])), Depends(conditional_get(FINANCE, REFERENCE))])
 def get_income_by_activity(
     year: Optional[int] = None,
     month: Optional[int] = None,
@@ -88,32 +65,30 @@ def get_income_by_activity(
     This can be filtered by year and/or month.
     """
     
+    summary = models.ClubMonthlySummary
+
     # Base filters for all income queries
     base_filters = [
-        models.ClubTransaction.club_id == current_user.club_id,
-        models.ClubTransaction.type == models.CategoryType.INCOME,
-    ]
-    if year:
-        base_filters.append(extract('year', models.ClubTransaction.transaction_date) == year)
-    if month:
-        base_filters.append(extract('month', models.ClubTransaction.transaction_date) == month)
+        summary.club_id == current_user.club_id,
+        summary.type == models.CategoryType.INCOME,
+    ] + summary_period_filters(year, month)
 
     # Income from specific activities
     income_by_activity = (
         db.query(
             models.Activity.name,
-            func.sum(models.ClubTransaction.amount)
+            func.sum(summary.total_amount)
         )
-        .join(models.Activity, models.ClubTransaction.activity_id == models.Activity.id)
+        .join(models.Activity, summary.activity_id == models.Activity.id)
         .filter(*base_filters)
         .group_by(models.Activity.name)
         .all()
     )
 
     # Income not tied to a specific activity (base fee, etc.)
-    other_income_filters = base_filters + [models.ClubTransaction.activity_id == None]
+    other_income_filters = base_filters + [summary.activity_id == None]
     base_fee_income = (
-        db.query(func.sum(models.ClubTransaction.amount))
+        db.query(func.sum(summary.total_amount))
         .filter(*other_income_filters)
         .scalar()
     )
@@ -125,7 +100,7 @@ def get_income_by_activity(
 
     return report
 
-@router.get("/income-vs-expenses/{year}", response_model=schemas.IncomeVsExpensesReport, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
+@router.get("/income-vs-expenses/{year}", response_model=schemas.IncomeVsExpensesReport, dependencies=[Depends(require_roles(['admin', 'tesorero'])), Depends(conditional_get(FINANCE))])
 def get_income_vs_expenses(
     year: int,
     db: Session = Depends(get_db),
@@ -134,28 +109,29 @@ def get_income_vs_expenses(
     """
     Calculates the total income and expenses for each month of a given year.
     """
+    summary = models.ClubMonthlySummary
+
     # Case statements to conditionally sum income and expenses
-    income_case = case((models.ClubTransaction.type == 'income', models.ClubTransaction.amount), else_=0)
-    expense_case = case((models.ClubTransaction.type == 'expense', models.ClubTransaction.amount), else_=0)
+    income_case = case((summary.type == models.CategoryType.INCOME, summary.total_amount), else_=0)
+    expense_case = case((summary.type == models.CategoryType.EXPENSE, summary.total_amount), else_=0)
 
-    # Query to get monthly totals
+    # Query to get monthly totals from the rollup (at most 12 months x a few keys per club)
     monthly_data = (
         db.query(
-            extract('month', models.ClubTransaction.transaction_date).label('month_num'),
+            summary.month,
             func.sum(income_case).label('total_income'),
             func.sum(expense_case).label('total_expense')
         )
         .filter(
-            models.ClubTransaction.club_id == current_user.club_id,
-            extract('year', models.ClubTransaction.transaction_date) == year
+            summary.club_id == current_user.club_id,
+            *summary_period_filters(year)
         )
-        .group_by('month_num')
-        .order_by('month_num')
+        .group_by(summary.month)
         .all()
     )
 
     # Create a dictionary for easy lookup
-    data_map = {row.month_num: row for row in monthly_data}
+    data_map = {row.month.month: row for row in monthly_data}
     
     # Ensure all 12 months are present in the report
     report_items = []
@@ -196,7 +172,7 @@ def get_income_vs_expenses(
         annual_balance=annual_balance
     )
 
-@router.get("/distribution-by-category", response_model=schemas.CategoryDistributionReport, dependencies=[Depends(require_roles(['admin', 'tesorero']))])
+@router.get("/distribution-by-category", response_model=schemas.CategoryDistributionReport, dependencies=[Depends(require_roles(['admin', 'tesorero'])), Depends(conditional_get(FINANCE, REFERENCE))])
 def get_distribution_by_category(
     year: Optional[int] = None,
     month: Optional[int] = None,
@@ -207,34 +183,32 @@ def get_distribution_by_category(
     Calculates the distribution of incomes and expenses grouped by category.
     This can be filtered by year and/or month.
     """
+    summary = models.ClubMonthlySummary
+
     # Base filters for all queries in this endpoint
-    base_filters = [models.ClubTransaction.club_id == current_user.club_id]
-    if year:
-        base_filters.append(extract('year', models.ClubTransaction.transaction_date) == year)
-    if month:
-        base_filters.append(extract('month', models.ClubTransaction.transaction_date) == month)
+    base_filters = [summary.club_id == current_user.club_id] + summary_period_filters(year, month)
 
     # Query for income distribution
-    income_filters = base_filters + [models.ClubTransaction.type == models.CategoryType.INCOME]
+    income_filters = base_filters + [summary.type == models.CategoryType.INCOME]
     income_query = (
         db.query(
             models.Category.name,
-            func.sum(models.ClubTransaction.amount)
+            func.sum(summary.total_amount)
         )
-        .outerjoin(models.Category, models.ClubTransaction.category_id == models.Category.id)
+        .outerjoin(models.Category, summary.category_id == models.Category.id)
         .filter(*income_filters)
         .group_by(models.Category.name)
         .all()
     )
 
     # Query for expense distribution
-    expense_filters = base_filters + [models.ClubTransaction.type == models.CategoryType.EXPENSE]
+    expense_filters = base_filters + [summary.type == models.CategoryType.EXPENSE]
     expense_query = (
         db.query(
             models.Category.name,
-            func.sum(models.ClubTransaction.amount)
+            func.sum(summary.total_amount)
         )
-        .outerjoin(models.Category, models.ClubTransaction.category_id == models.Category.id)
+        .outerjoin(models.Category, summary.category_id == models.Category.id)
         .filter(*expense_filters)
         .group_by(models.Category.name)
         .all()
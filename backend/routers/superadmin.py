@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, status, File, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import json
 import os
 import uuid
 
 from .. import models, schemas, security
 from ..database import get_db
+from ..billing import generate_monthly_debts_for_all_clubs, DEBT_GENERATION_WORKERS
+from ..invalidation import publish, ALL
+from ..data_versions import bump_data_version, REFERENCE
 
 from sqlalchemy import func
 
@@ -63,6 +69,7 @@ def update_club_by_superadmin(
         setattr(db_club, key, value)
     
     db.add(db_club)
+    bump_data_version(db, club_id, REFERENCE)
     db.commit()
     db.refresh(db_club)
     return db_club
@@ -82,6 +89,7 @@ def deactivate_club_by_superadmin(
 
     db_club.is_active = False
     db.add(db_club)
+    bump_data_version(db, club_id, REFERENCE)
     db.commit()
     return
 
@@ -105,23 +113,33 @@ def permanently_delete_club(
     debt_ids_subquery = db.query(models.Debt.id).filter(models.Debt.member_id.in_(member_ids_subquery)).subquery()
 
     # Delete related entities in order of dependency
+    db.query(models.CheckIn).filter(models.CheckIn.club_id == club_id).delete(synchronize_session=False)
     db.query(models.ClubTransaction).filter(models.ClubTransaction.club_id == club_id).delete(synchronize_session=False)
     db.query(models.Payment).filter(models.Payment.debt_id.in_(debt_ids_subquery)).delete(synchronize_session=False)
     db.query(models.DebtItem).filter(models.DebtItem.debt_id.in_(debt_ids_subquery)).delete(synchronize_session=False)
     db.query(models.Debt).filter(models.Debt.member_id.in_(member_ids_subquery)).delete(synchronize_session=False)
 
+    user_emails = [email for email, in db.query(models.User.email).filter(models.User.club_id == club_id)]
+
     members_to_clear = db.query(models.Member).filter(models.Member.id.in_(member_ids_subquery)).all()
     for member in members_to_clear:
         member.activities.clear()
     
     db.commit() # Commit association changes before deleting members
 
+    db.query(models.MemberBalance).filter(models.MemberBalance.club_id == club_id).delete(synchronize_session=False)
+    db.query(models.ClubDataVersion).filter(models.ClubDataVersion.club_id == club_id).delete(synchronize_session=False)
     db.query(models.Member).filter(models.Member.id.in_(member_ids_subquery)).delete(synchronize_session=False)
     db.query(models.Activity).filter(models.Activity.club_id == club_id).delete(synchronize_session=False)
     db.query(models.Category).filter(models.Category.club_id == club_id).delete(synchronize_session=False)
     db.query(models.User).filter(models.User.club_id == club_id).delete(synchronize_session=False)
 
+    db.query(models.DeletedRow).filter(models.DeletedRow.club_id == club_id).delete(synchronize_session=False) # Written by the deletes above
+    db.query(models.ClubSyncHorizon).filter(models.ClubSyncHorizon.club_id == club_id).delete(synchronize_session=False)
+
     db.delete(club)
+    publish(db, club_id, ALL)
+    security.invalidate_principals(db, *user_emails)
     db.commit()
 
     return
@@ -168,6 +186,7 @@ async def upload_club_logo(
 
     db_club.logo_url = logo_url
     db.add(db_club)
+    bump_data_version(db, club_id, REFERENCE)
     db.commit()
     db.refresh(db_club)
 
@@ -229,6 +248,31 @@ def update_user_by_superadmin(
         setattr(db_user, key, value)
     
     db.add(db_user)
+    if db_user.club_id is not None:
+        bump_data_version(db, db_user.club_id, REFERENCE)
+    security.invalidate_principals(db, db_user.email)
     db.commit()
     db.refresh(db_user)
     return db_user
+
+
+@router.post("/generate-monthly-debt")
+def generate_monthly_debt_for_all_clubs(
+    request: schemas.DebtGenerationRequest,
+    workers: Optional[int] = Query(None, ge=1, le=DEBT_GENERATION_WORKERS)
+):
+    """
+    Generates the monthly debt for every active club in one run.
+    Clubs are processed in parallel, each one in its own transaction, and the result of
+    each club is streamed back as a JSON line as soon as it finishes.
+    """
+    try:
+        month_date = datetime.strptime(request.month, "%Y-%m").date().replace(day=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de mes inválido. Use AAAA-MM.")
+
+    def stream_results():
+        for result in generate_monthly_debts_for_all_clubs(month_date, max_workers=workers):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from .. import models, schemas
+from ..security import require_roles, get_current_user
+from ..sync import read_club_delta, InvalidSyncCursor, SyncCursorExpired
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"],
+    # The delta holds the club's debts and transactions: the same roles as /transactions
+    dependencies=[Depends(require_roles(['admin', 'tesorero']))],
+)
+
+@router.get("", response_model=schemas.SyncDelta)
+def sync_club(
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Members, activities, categories, debts and transactions of the user's club created,
+    updated or deleted since `cursor`, the `cursor` returned by the previous sync. Without
+    one (first sync, or to rebuild the local replica) everything is returned and `full` is set.
+    Paged: while `has_more` is set, call again with the returned cursor. 410 when deletions
+    since the cursor were already pruned: start over without a cursor.
+    """
+    try:
+        return read_club_delta(current_user.club_id, cursor)
+    except InvalidSyncCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SyncCursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 from typing import List, Optional
-from datetime import date
+from datetime import date, timedelta
+import base64
 import os
 import uuid
 
 from .. import models, schemas
 from ..database import get_db
 from ..security import require_roles, get_current_user
+from ..loading import response_loader_options
+from ..reference_cache import reference_cache
+from ..data_versions import bump_data_version, conditional_get, FINANCE
 
 router = APIRouter(
     prefix="/transactions",
@@ -37,12 +41,8 @@ async def create_club_transaction(
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
     if category_id:
-        db_category = db.query(models.Category).filter(
-            models.Category.id == category_id,
-            models.Category.club_id == current_user.club_id,
-            models.Category.type == type # Ensure category type matches transaction type
-        ).first()
-        if not db_category:
+        db_category = reference_cache.get(db, current_user.club_id).categories.get(category_id)
+        if not db_category or db_category.type != models.CategoryType(type.value): # Ensure category type matches transaction type
             raise HTTPException(status_code=404, detail="Category not found or does not match transaction type")
 
     receipt_url = None
@@ -70,10 +70,53 @@ async def create_club_transaction(
         club_id=current_user.club_id
     )
     db.add(db_transaction)
+    bump_data_version(db, current_user.club_id, FINANCE)
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
 
+def encode_cursor(transaction: models.ClubTransaction) -> str:
+    """Opaque keyset cursor for the (transaction_date, id) of the last item of a page."""
+    return base64.urlsafe_b64encode(f"{transaction.transaction_date.isoformat()}|{transaction.id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        cursor_date, cursor_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(cursor_date), int(cursor_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def count_club_transactions(
+    db: Session,
+    club_id: int,
+    type: Optional[schemas.CategoryType],
+    category_id: Optional[int],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    query
+) -> int:
+    """
+    Total number of transactions for the filters. When the date range is made of whole months
+    (or absent), it is read from the monthly rollup instead of counting the rows.
+    """
+    whole_months = (start_date is None or start_date.day == 1) and (
+        end_date is None or (end_date + timedelta(days=1)).day == 1
+    )
+    if not whole_months:
+        return query.count()
+
+    summary = models.ClubMonthlySummary
+    count_query = db.query(func.coalesce(func.sum(summary.transaction_count), 0)).filter(summary.club_id == club_id)
+    if type:
+        count_query = count_query.filter(summary.type == type)
+    if category_id:
+        count_query = count_query.filter(summary.category_id == category_id)
+    if start_date:
+        count_query = count_query.filter(summary.month >= start_date)
+    if end_date:
+        count_query = count_query.filter(summary.month <= end_date)
+    return count_query.scalar()
+
 @router.get("/", response_model=schemas.ClubTransactionPage)
 def read_club_transactions(
     db: Session = Depends(get_db),
@@ -83,10 +126,15 @@ def read_club_transactions(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None
 ):
     """
     Retrieve club transactions for the current user's club, with optional filters and pagination.
+    Pagination is by offset (skip/limit) or, for constant cost on deep pages, by keyset: pass the
+    `next_cursor` of the previous page as `cursor` (use an empty value for the first page).
+    The total is included by default in offset mode and only on request in cursor mode.
     """
     query = db.query(models.ClubTransaction).filter(
         models.ClubTransaction.club_id == current_user.club_id
@@ -100,13 +148,31 @@ def read_club_transactions(
         query = query.filter(models.ClubTransaction.transaction_date >= start_date)
     if end_date:
         query = query.filter(models.ClubTransaction.transaction_date <= end_date)
-    
-    total = query.count()
-    items = query.order_by(models.ClubTransaction.transaction_date.desc()).offset(skip).limit(limit).all()
-    
-    return {"items": items, "total": total}
 
-@router.get("/balance", response_model=schemas.Balance)
+    keyset_mode = cursor is not None
+    if include_total is None:
+        include_total = not keyset_mode
+
+    total = None
+    if include_total:
+        total = count_club_transactions(db, current_user.club_id, type, category_id, start_date, end_date, query)
+
+    # Served by the (club_id, transaction_date, id) index
+    query = query.options(*response_loader_options(models.ClubTransaction, schemas.ClubTransaction)).order_by(models.ClubTransaction.transaction_date.desc(), models.ClubTransaction.id.desc())
+    if keyset_mode:
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            query = query.filter(
+                tuple_(models.ClubTransaction.transaction_date, models.ClubTransaction.id) < tuple_(cursor_date, cursor_id)
+            )
+        items = query.limit(limit).all()
+    else:
+        items = query.offset(skip).limit(limit).all()
+
+    next_cursor = encode_cursor(items[-1]) if len(items) == limit else None
+    return {"items": items, "total": total, "next_cursor": next_cursor}
+
+@router.get("/balance", response_model=schemas.Balance, dependencies=[Depends(conditional_get(FINANCE))])
 def get_club_balance(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -115,16 +181,16 @@ def get_club_balance(
     Calculate and return the total balance for the current user's club,
     including a breakdown by payment method.
     """
-    # Query to get sum of amounts grouped by type and payment_method
+    # Query to get sum of amounts grouped by type and payment_method, read from the monthly rollup
     results = db.query(
-        models.ClubTransaction.type,
-        models.ClubTransaction.payment_method,
-        func.sum(models.ClubTransaction.amount)
+        models.ClubMonthlySummary.type,
+        models.ClubMonthlySummary.payment_method,
+        func.sum(models.ClubMonthlySummary.total_amount)
     ).filter(
-        models.ClubTransaction.club_id == current_user.club_id
+        models.ClubMonthlySummary.club_id == current_user.club_id
     ).group_by(
-        models.ClubTransaction.type,
-        models.ClubTransaction.payment_method
+        models.ClubMonthlySummary.type,
+        models.ClubMonthlySummary.payment_method
     ).all()
 
     breakdown = {}
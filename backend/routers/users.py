@@ -6,8 +6,9 @@ import os
 
 from .. import models, schemas, security
 from ..database import get_db
-from ..security import get_current_user, get_password_hash, create_random_string, require_roles
+from ..security import get_current_user, get_password_hash, get_password_hash_async, create_random_string, require_roles, invalidate_principals
 from ..email_service import email_service
+from ..data_versions import bump_data_version, REFERENCE
 
 router = APIRouter()
 
@@ -55,7 +56,7 @@ async def create_user(
     db.refresh(new_club)
 
     temporary_password = create_random_string()
-    hashed_password = get_password_hash(temporary_password)
+    hashed_password = await get_password_hash_async(temporary_password)
     
     new_user = models.User(
         email=email,
@@ -107,6 +108,7 @@ def create_user_by_admin(user_in: schemas.UserCreateByAdmin, db: Session = Depen
         recovery_email=user_in.recovery_email
     )
     db.add(new_user)
+    bump_data_version(db, current_user.club_id, REFERENCE)
     db.commit()
     db.refresh(new_user)
     return new_user
@@ -126,6 +128,8 @@ def update_user_by_admin(user_id: int, user_in: schemas.UserUpdateByAdmin, db: S
         setattr(db_user, key, value)
     
     db.add(db_user)
+    bump_data_version(db, current_user.club_id, REFERENCE)
+    invalidate_principals(db, db_user.email)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -142,6 +146,8 @@ def delete_user_by_admin(user_id: int, db: Session = Depends(get_db), current_us
 
     if db_user:
         db_user.is_active = False
+        bump_data_version(db, current_user.club_id, REFERENCE)
+        invalidate_principals(db, db_user.email)
         db.commit()
     
     return
@@ -168,6 +174,8 @@ def change_user_password_by_admin(
     db_user.force_password_change = True
     
     db.add(db_user)
+    bump_data_version(db, current_user.club_id, REFERENCE)
+    invalidate_principals(db, db_user.email)
     db.commit()
     
     return
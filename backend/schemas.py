@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import enum
 from datetime import date, datetime # Added datetime
 
@@ -51,10 +51,58 @@ class Member(MemberBase):
     class Config:
         from_attributes = True
 
+class MemberBalance(BaseModel):
+    member_id: int
+    total_billed: float
+    total_paid: float
+    outstanding: float
+    oldest_unpaid_month: Optional[date] = None
+    class Config:
+        from_attributes = True
+
 class MemberPage(BaseModel):
     items: List[Member]
     total: int
 
+class MemberTypeaheadItem(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    dni: Optional[str] = None
+    member_number: Optional[str] = None
+    class Config:
+        from_attributes = True
+
+class CheckInRequest(BaseModel):
+    code: str # Member number or DNI, as scanned
+    activity_id: Optional[int] = None
+
+class CheckInResult(BaseModel):
+    allowed: bool
+    reason: str # ok, not_found, ambiguous, inactive, not_enrolled, in_arrears
+    member_id: Optional[int] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    outstanding: Optional[float] = None
+    oldest_unpaid_month: Optional[date] = None
+
+class MemberImportRow(BaseModel):
+    row: int
+    dni: Optional[str] = None
+    member_id: Optional[int] = None
+    status: str # "created", "updated" or "error"
+    detail: Optional[str] = None
+
+class MemberImportResult(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    rows: List[MemberImportRow]
+
+class ClubRestoreResult(BaseModel):
+    rows: int
+    tables: Dict[str, int] # Rows restored per table
+
 class PaymentBase(BaseModel):
     amount: float
     payment_date: date
@@ -158,6 +206,11 @@ class TokenData(BaseModel):
 class DebtGenerationRequest(BaseModel):
     month: str # Expected format: YYYY-MM
 
+class DebtGenerationResult(BaseModel):
+    message: str
+    generated: int
+    skipped: int # Members that already had a debt for the month
+
 class DebtItemBase(BaseModel):
     description: str
     amount: float
@@ -171,6 +224,8 @@ class DebtItem(DebtItemBase):
 class DebtBase(BaseModel):
     month: date
     total_amount: float
+    paid_amount: float = 0
+    remaining_amount: float = 0
     is_paid: bool
 
 class Debt(DebtBase):
@@ -181,6 +236,36 @@ class Debt(DebtBase):
     class Config:
         from_attributes = True
 
+class MemberPaymentItem(BaseModel):
+    debt_id: int
+    month: date
+    payment_id: int
+    amount: float
+    paid_amount: float
+    remaining_amount: float
+    is_paid: bool
+
+class MemberPaymentResult(BaseModel):
+    items: List[MemberPaymentItem]
+    total_allocated: float
+    outstanding_after: float
+
+class PaymentImportRow(BaseModel):
+    row: int
+    dni: Optional[str] = None
+    member_number: Optional[str] = None
+    member_id: Optional[int] = None
+    status: str # "ok" or "error"
+    detail: Optional[str] = None
+    amount: Optional[float] = None
+    debts_paid: Optional[int] = None
+
+class PaymentImportResult(BaseModel):
+    imported: int
+    failed: int
+    total_amount: float
+    rows: List[PaymentImportRow]
+
 class ManualChargeCreate(BaseModel):
     member_id: int
     date: date
@@ -254,7 +339,8 @@ class ClubTransaction(ClubTransactionBase):
 
 class ClubTransactionPage(BaseModel):
     items: List[ClubTransaction]
-    total: int
+    total: Optional[int] = None # Only included on request in cursor mode
+    next_cursor: Optional[str] = None
 
 class Balance(BaseModel):
     total: float
@@ -306,3 +392,19 @@ class StudentAccountStatus(BaseModel):
 
 class ProfessorStudentReport(BaseModel):
     students: List[StudentAccountStatus]
+
+# --- Delta sync ---
+class SyncDeletion(BaseModel):
+    entity: str # members, activities, categories, debts or transactions
+    id: int
+
+class SyncDelta(BaseModel):
+    cursor: str # Pass it back as `cursor` on the next sync
+    full: bool # A full sync (no cursor was given): replace the local replica instead of merging
+    has_more: bool # Call again with `cursor` for the next page of this sync
+    members: List[Member]
+    activities: List[Activity]
+    categories: List[Category]
+    debts: List[Debt]
+    transactions: List[ClubTransaction]
+    deleted: List[SyncDeletion]
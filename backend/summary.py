@@ -0,0 +1,56 @@
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text, extract
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Aggregation shared by the triggers on club_transactions and the rebuild below.
+# Keep both in sync with models.ClubMonthlySummary.
+REBUILD_SUMMARY_SQL = text("""
+INSERT INTO club_monthly_summary (club_id, month, type, category_id, activity_id, payment_method, total_amount, transaction_count)
+SELECT club_id, CAST(date_trunc('month', transaction_date) AS DATE), type, category_id, activity_id, payment_method,
+       SUM(amount), COUNT(*)
+FROM club_transactions
+WHERE CAST(:club_id AS INTEGER) IS NULL OR club_id = :club_id
+GROUP BY 1, 2, 3, 4, 5, 6
+""")
+
+
+# Exclusive counterpart of the shared lock the summary trigger takes for every club it updates
+SUMMARY_CLUB_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext('club_monthly_summary'), :club_id)")
+
+
+def rebuild_monthly_summary(db: Session, club_id: Optional[int] = None) -> int:
+    """
+    Recomputes club_monthly_summary from club_transactions, for one club or for all of them.
+    Writes to the transactions being rebuilt are blocked until the caller commits, so the rollup
+    cannot miss a transaction inserted meanwhile: for one club, through the advisory lock its
+    summary trigger takes; for all of them, with a table lock. Returns the number of summary rows.
+    """
+    if club_id is None:
+        db.execute(text("LOCK TABLE club_transactions IN SHARE MODE"))
+    else:
+        db.execute(SUMMARY_CLUB_LOCK_SQL, {"club_id": club_id})
+    db.execute(
+        text("DELETE FROM club_monthly_summary WHERE CAST(:club_id AS INTEGER) IS NULL OR club_id = :club_id"),
+        {"club_id": club_id}
+    )
+    return db.execute(REBUILD_SUMMARY_SQL, {"club_id": club_id}).rowcount
+
+
+def summary_period_filters(year: Optional[int] = None, month: Optional[int] = None) -> List:
+    """
+    Filters on ClubMonthlySummary.month for an optional year and/or month.
+    A year is turned into a range so the (club_id, month) key can be used.
+    """
+    filters = []
+    if year and month:
+        filters.append(models.ClubMonthlySummary.month == date(year, month, 1))
+    elif year:
+        filters.append(models.ClubMonthlySummary.month >= date(year, 1, 1))
+        filters.append(models.ClubMonthlySummary.month <= date(year, 12, 1))
+    elif month:
+        filters.append(extract('month', models.ClubMonthlySummary.month) == month)
+    return filters
@@ -0,0 +1,174 @@
+"""
+Delta sync for clients that keep a local replica of a club (the mobile app).
+
+Every ChangeTracked row carries change_seq, the id of the last transaction that inserted or
+updated it (pg_current_xact_id(), set by trigger), and deleted_rows stamps hard deletes the
+same way. Transaction ids grow monotonically, but transactions do not commit in id order, so
+the cursor handed to the client is not the highest change_seq it received: it is the xmin of
+the snapshot the delta was read from, below which every transaction had already finished. The
+next delta returns every change at or above it: those still in flight last time and everything
+after. A few rows may come twice; clients upsert them by id.
+
+A sync (full or delta) is returned in pages of at most SYNC_PAGE_ROWS rows, walking the
+entities and then the tombstones in id order; the cursor of a page with `has_more` points at
+the next one. Pages are read from separate snapshots, but the horizon is the xmin of the first
+page's, so whatever changes or is deleted while the client pages through is in the next delta.
+
+prune-tombstones records, per club, the highest change_seq it deleted: a delta cursor at or
+below it may have lost deletions, and raises SyncCursorExpired (the client must sync in full).
+
+On other databases (SQLite in tests) there are no transaction ids: every sync is a full one.
+"""
+import base64
+import os
+from typing import NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .database import SessionLocal
+from .loading import response_loader_options
+
+SYNC_PAGE_ROWS = int(os.getenv("SYNC_PAGE_ROWS", 1000))
+
+# Synced entities, in page order: name -> (model, response schema)
+SYNC_ENTITIES = {
+    "members": (models.Member, schemas.Member),
+    "activities": (models.Activity, schemas.Activity),
+    "categories": (models.Category, schemas.Category),
+    "debts": (models.Debt, schemas.Debt),
+    "transactions": (models.ClubTransaction, schemas.ClubTransaction),
+}
+ENTITY_NAMES = list(SYNC_ENTITIES)
+TOMBSTONES = len(ENTITY_NAMES) # Position of the tombstones, after every entity
+TABLE_ENTITIES = {model.__tablename__: name for name, (model, schema) in SYNC_ENTITIES.items()}
+
+SNAPSHOT_XMIN_SQL = text("SELECT CAST(CAST(pg_snapshot_xmin(pg_current_snapshot()) AS TEXT) AS BIGINT)")
+
+PRUNE_TOMBSTONES_SQL = text("""
+WITH pruned AS (
+    DELETE FROM deleted_rows WHERE deleted_at < :before
+    RETURNING club_id, change_seq
+), horizons AS (
+    INSERT INTO club_sync_horizons (club_id, pruned_change_seq)
+    SELECT club_id, MAX(change_seq) FROM pruned WHERE club_id IS NOT NULL GROUP BY club_id
+    ON CONFLICT (club_id) DO UPDATE
+    SET pruned_change_seq = GREATEST(club_sync_horizons.pruned_change_seq, EXCLUDED.pruned_change_seq)
+)
+SELECT COUNT(*) FROM pruned
+""")
+
+
+class InvalidSyncCursor(ValueError):
+    pass
+
+
+class SyncCursorExpired(Exception):
+    pass
+
+
+class SyncPosition(NamedTuple):
+    since: Optional[int] # Changes at or after it; None for a full sync
+    horizon: Optional[int] = None # `since` of the next sync, set by the first page
+    entity: int = 0 # Index in ENTITY_NAMES, or TOMBSTONES
+    after_id: int = 0 # Last id returned of that entity
+
+
+def encode_sync_cursor(club_id: int, position: SyncPosition) -> str:
+    fields = (club_id,) + tuple(position)
+    return base64.urlsafe_b64encode("|".join("" if field is None else str(field) for field in fields).encode()).decode()
+
+
+def decode_sync_cursor(cursor: str, club_id: int) -> SyncPosition:
+    """The position of a cursor issued for this club."""
+    try:
+        fields = [int(part) if part else None for part in base64.urlsafe_b64decode(cursor.encode()).decode().split("|")]
+        cursor_club_id, since, horizon, entity, after_id = fields
+    except ValueError:
+        raise InvalidSyncCursor("Invalid cursor.")
+    if cursor_club_id != club_id:
+        raise InvalidSyncCursor("The cursor belongs to another club.")
+    if entity is None or after_id is None or not 0 <= entity <= TOMBSTONES:
+        raise InvalidSyncCursor("Invalid cursor.")
+    return SyncPosition(since, horizon, entity, after_id)
+
+
+def changed_rows_query(db: Session, name: str, club_id: int, since: Optional[int], after_id: int = 0):
+    """Rows of a synced entity that belong to the club, after `after_id`, changed at or after `since` if given."""
+    model, schema = SYNC_ENTITIES[name]
+    query = db.query(model).options(*response_loader_options(model, schema)).filter(model.id > after_id)
+    if model is models.Debt:
+        query = query.join(models.Member, models.Member.id == models.Debt.member_id).filter(models.Member.club_id == club_id)
+    else:
+        query = query.filter(model.club_id == club_id)
+    if since is not None:
+        query = query.filter(model.change_seq >= since)
+    return query.order_by(model.id)
+
+
+def tombstones_query(db: Session, club_id: int, since: int, after_id: int = 0):
+    """Tombstones of the club's synced entities recorded at or after `since`, after `after_id`."""
+    return db.query(models.DeletedRow).filter(
+        models.DeletedRow.club_id == club_id,
+        models.DeletedRow.change_seq >= since,
+        models.DeletedRow.table_name.in_(TABLE_ENTITIES),
+        models.DeletedRow.id > after_id
+    ).order_by(models.DeletedRow.id)
+
+
+def prune_deleted_rows(db: Session, before) -> int:
+    """Deletes the tombstones recorded before `before`, moving the clubs' sync horizons past them. Returns how many."""
+    return db.execute(PRUNE_TOMBSTONES_SQL, {"before": before}).scalar()
+
+
+def read_club_delta(club_id: int, cursor: Optional[str] = None, page_rows: int = SYNC_PAGE_ROWS) -> schemas.SyncDelta:
+    """
+    One page of everything of the club's synced entities created, updated or deleted since
+    `cursor` (all of it without one), read from a single snapshot. Raises InvalidSyncCursor,
+    and SyncCursorExpired when tombstones the delta needs were pruned.
+    """
+    position = decode_sync_cursor(cursor, club_id) if cursor else SyncPosition(since=None)
+    db = SessionLocal() # Its own session: the snapshot must be taken by its first statement
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+            if position.horizon is None:
+                position = position._replace(horizon=db.execute(SNAPSHOT_XMIN_SQL).scalar())
+            if position.since is not None:
+                pruned = db.get(models.ClubSyncHorizon, club_id)
+                if pruned is not None and position.since <= pruned.pruned_change_seq:
+                    raise SyncCursorExpired("Deletions since this cursor were pruned; sync in full.")
+        else:
+            position = SyncPosition(since=None, entity=position.entity, after_id=position.after_id)
+
+        since, entity, after_id = position.since, position.entity, position.after_id
+        last = TOMBSTONES if since is not None else TOMBSTONES - 1 # A full sync sends no deletions
+        entities = {name: [] for name in ENTITY_NAMES}
+        deleted = []
+        room = page_rows
+        while room > 0 and entity <= last:
+            if entity == TOMBSTONES:
+                rows = tombstones_query(db, club_id, since, after_id).limit(room + 1).all()
+                deleted = [schemas.SyncDeletion(entity=TABLE_ENTITIES[row.table_name], id=row.row_id) for row in rows[:room]]
+            else:
+                name = ENTITY_NAMES[entity]
+                rows = changed_rows_query(db, name, club_id, since, after_id).limit(room + 1).all()
+                entities[name] = [SYNC_ENTITIES[name][1].model_validate(row) for row in rows[:room]]
+            if len(rows) > room: # The page is full, and this entity goes on in the next one
+                after_id = rows[room - 1].id
+                break
+            room -= len(rows)
+            entity, after_id = entity + 1, 0
+    finally:
+        db.close()
+
+    has_more = entity <= last
+    next_position = SyncPosition(since, position.horizon, entity, after_id) if has_more else SyncPosition(position.horizon)
+    return schemas.SyncDelta(
+        cursor=encode_sync_cursor(club_id, next_position),
+        full=since is None,
+        has_more=has_more,
+        deleted=deleted,
+        **entities
+    )
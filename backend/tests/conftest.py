@@ -0,0 +1,137 @@
+"""
+The tests run against the PostgreSQL database in TEST_DATABASE_URL, whose tables are created
+at the start of the session and dropped at the end; without one they are skipped.
+
+create_all only builds the tables: the extensions, functions and triggers the migrations add
+on top of them are installed by install_database_objects, with the SQL of those migrations.
+"""
+import importlib.util
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL # Read by backend.database on import
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("SENDGRID_API_KEY", "test") # The email service is built when backend.main is imported
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+
+
+def pytest_collection_modifyitems(config, items):
+    if not TEST_DATABASE_URL:
+        skip = pytest.mark.skip(reason="TEST_DATABASE_URL is not set")
+        for item in items:
+            item.add_marker(skip)
+
+
+def load_migration(revision: str):
+    """The module of a migration, for the SQL it defines."""
+    path, = MIGRATIONS_DIR.glob(f"{revision}_*.py")
+    spec = importlib.util.spec_from_file_location(f"migration_{revision}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def install_database_objects(connection):
+    # 7c3f2b9e1a58: member search
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+    connection.execute(text("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+        $$ SELECT public.unaccent('public.unaccent', $1) $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """))
+
+    # a6d2e8f4c1b7 and c8e4b1f6a2d9: change_seq, updated_at and the tombstones of the sync
+    tombstones, change_seq = load_migration("a6d2e8f4c1b7"), load_migration("c8e4b1f6a2d9")
+    connection.execute(text(tombstones.RECORD_DELETED_ROWS_FUNCTION))
+    connection.execute(text(change_seq.TRACK_ROW_CHANGE_FUNCTION))
+    connection.execute(text(change_seq.TOUCH_ENROLLED_MEMBERS_FUNCTION))
+    for table in change_seq.CHANGE_TRACKED_TABLES:
+        connection.execute(text(f"""
+            CREATE TRIGGER {table}_track_row_change BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION track_row_change()
+        """))
+        connection.execute(text(f"""
+            CREATE TRIGGER {table}_record_deleted_rows AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION record_deleted_rows()
+        """))
+    connection.execute(text("""
+        CREATE TRIGGER member_activity_touch_members_insert AFTER INSERT ON member_activity
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION touch_enrolled_members()
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER member_activity_touch_members_delete AFTER DELETE ON member_activity
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION touch_enrolled_members()
+    """))
+
+    # 8d21f5c7b3e6, with the function of a3c9e5f7b1d4: the monthly summary rollup
+    connection.execute(text(load_migration("a3c9e5f7b1d4").SUMMARY_TRIGGER_FUNCTION))
+    for operation, transition_tables in (
+        ("insert", "NEW TABLE AS new_rows"),
+        ("update", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ):
+        connection.execute(text(f"""
+            CREATE TRIGGER club_transactions_summary_{operation} AFTER {operation.upper()} ON club_transactions
+            REFERENCING {transition_tables}
+            FOR EACH STATEMENT EXECUTE FUNCTION club_monthly_summary_apply()
+        """))
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from backend import database, models
+    models.Base.metadata.create_all(database.engine)
+    with database.engine.begin() as connection:
+        install_database_objects(connection)
+    yield database.engine
+    models.Base.metadata.drop_all(database.engine)
+
+
+@pytest.fixture
+def db(engine):
+    from backend.database import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.fixture
+def club(db):
+    from backend import models
+    club = models.Club(name=f"Club {uuid.uuid4().hex[:8]}", is_active=True)
+    db.add(club)
+    db.commit()
+    return club
+
+
+@pytest.fixture
+def admin(db, club):
+    from backend import models
+    user = models.User(email=f"admin-{uuid.uuid4().hex[:8]}@example.com", hashed_password="hash", role="admin", club_id=club.id, is_active=True)
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def client(admin):
+    """An API client authenticated as the club's admin."""
+    from fastapi.testclient import TestClient
+    from backend import security
+    from backend.main import app
+    principal = security.Principal(admin.id, admin.email, admin.role, admin.club_id, True)
+    app.dependency_overrides[security.get_current_user] = lambda: principal
+    yield TestClient(app)
+    app.dependency_overrides.clear()
@@ -0,0 +1,23 @@
+from decimal import Decimal
+
+from backend.checkin import AMBIGUOUS, ClubAccessIndex, MemberAccess
+
+
+def member(member_id: int, is_active: bool) -> MemberAccess:
+    return MemberAccess(member_id, "Socio", f"Apellido {member_id}", is_active, frozenset(), Decimal("0.00"), None)
+
+
+def test_shared_codes_resolve_to_the_active_member_or_ambiguous():
+    old, current, other = member(1, False), member(2, True), member(3, True)
+    index = ClubAccessIndex([old, current, other], [
+        (2, "100", "30123456"),
+        (1, "100", "30123456"), # The inactive record, after its re-registration
+        (3, "200", "30999999"),
+        (1, "200", None),
+        (2, None, "30.999.999"), # Two active members with one DNI
+    ])
+
+    assert index.lookup("100") == current
+    assert index.lookup("30123456") == current
+    assert index.lookup("200") == other
+    assert index.lookup("30999999") is AMBIGUOUS
@@ -0,0 +1,13 @@
+import json
+
+from backend.invalidation import NOTIFY_PAYLOAD_LIMIT, notification_payloads
+
+
+def test_many_keys_are_split_across_notifications():
+    emails = [f"user-{i:04d}@some-long-club-domain.example.com" for i in range(600)]
+
+    payloads = list(notification_payloads(3, "users", emails))
+
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= NOTIFY_PAYLOAD_LIMIT for payload in payloads)
+    assert [key for payload in payloads for key in json.loads(payload)["keys"]] == emails
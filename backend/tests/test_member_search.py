@@ -0,0 +1,48 @@
+"""Member search: accent-insensitive trigram matching, ranked by similarity, and the typeahead limit."""
+from backend import models
+from backend.member_search import apply_member_search
+
+
+def add_members(db, club, *names):
+    members = [
+        models.Member(first_name=first_name, last_name=last_name, phone="555", club_id=club.id, is_active=True)
+        for first_name, last_name in names
+    ]
+    db.add_all(members)
+    db.commit()
+    return members
+
+
+def search(db, club, term):
+    query = db.query(models.Member).filter(models.Member.club_id == club.id)
+    query, rank = apply_member_search(query, term, db.get_bind().dialect.name)
+    return query.order_by(rank, models.Member.id).all()
+
+
+def test_search_ignores_accents_and_case(db, club):
+    gonzalez, = add_members(db, club, ("José", "González"))
+    add_members(db, club, ("Ana", "Pérez"))
+
+    for term in ("gonzalez", "GONZÁLEZ", "jose gonz"):
+        assert [member.id for member in search(db, club, term)] == [gonzalez.id]
+
+
+def test_search_ranks_whole_word_matches_first(db, club):
+    martinez, martin = add_members(db, club, ("Ana", "Martinez"), ("Luis", "Martín"))
+
+    assert [member.id for member in search(db, club, "martin")] == [martin.id, martinez.id]
+
+
+def test_typeahead_returns_at_most_limit_members(db, club, client):
+    add_members(db, club, *[("Socio", f"Gómez {number:02d}") for number in range(15)])
+
+    response = client.get("/members/typeahead", params={"q": "gomez", "limit": 5})
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+    assert len(client.get("/members/typeahead", params={"q": "gomez"}).json()) == 10
+
+
+def test_typeahead_limit_must_be_between_1_and_50(client):
+    for limit in (0, 51):
+        assert client.get("/members/typeahead", params={"q": "gomez", "limit": limit}).status_code == 422
@@ -0,0 +1,71 @@
+"""Upper bounds on the SQL statements of hot endpoints: they must not grow with the page or the member."""
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from backend import models
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def activities(db, club, admin):
+    activities = [
+        models.Activity(name=f"Activity {i}", monthly_cost=Decimal("10.00"), club_id=club.id, profesor_id=admin.id)
+        for i in range(12)
+    ]
+    db.add_all(activities)
+    db.commit()
+    return activities
+
+
+def add_member(db, club, activities, number: int) -> models.Member:
+    member = models.Member(first_name="Socio", last_name=f"Apellido {number:03d}", phone="555", club_id=club.id, is_active=True)
+    member.activities = list(activities)
+    db.add(member)
+    db.commit()
+    return member
+
+
+def test_members_page_statements_do_not_grow_with_the_page_size(engine, db, club, activities, client):
+    for number in range(40):
+        add_member(db, club, activities[:number % 4 + 1], number)
+
+    counts = []
+    for size in (5, 20, 40):
+        with count_statements(engine) as statements:
+            response = client.get("/members", params={"size": size})
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == size
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1] == counts[2]
+    assert counts[0] <= 8 # Count, members, and one per loaded relationship level
+
+
+def test_add_activity_statements_do_not_grow_with_the_enrollments(engine, db, club, activities, client):
+    counts = []
+    for number, enrolled in enumerate((1, 5, 11)):
+        member = add_member(db, club, activities[:enrolled], number)
+        with count_statements(engine) as statements:
+            response = client.post(f"/members/{member.id}/activities/{activities[-1].id}")
+        assert response.status_code == 200
+        assert len(response.json()["activities"]) == enrolled + 1
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1] == counts[2]
+    assert counts[0] <= 15
@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+from backend import models
+from backend.restore import restore_club
+
+
+def make_archive(tables: dict) -> zipfile.ZipFile:
+    """A backup archive with one CSV per table (name -> rows, the header first) and a full backup manifest."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        for table_name, rows in tables.items():
+            content = io.StringIO()
+            csv.writer(content).writerows(rows)
+            archive.writestr(f"{table_name}.csv", content.getvalue())
+        archive.writestr("manifest.json", json.dumps({"club_id": 0, "since": None, "next_since": None}))
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+def test_restore_rejects_superadmin_users(db, club):
+    archive = make_archive({
+        "users": [
+            ["id", "email", "hashed_password", "is_active", "role", "club_id"],
+            [1, f"admin-{club.id}@example.com", "hash", "true", "admin", club.id],
+            [2, f"root-{club.id}@example.com", "known-hash", "true", "superadmin", club.id],
+        ],
+    })
+
+    with pytest.raises(ValueError, match="superadmin"):
+        restore_club(db, club.id, archive)
+    db.rollback()
+
+    assert db.query(models.User).filter(models.User.email == f"root-{club.id}@example.com").first() is None
+
+
+def test_restore_rejects_incremental_archive_without_deletions(db, club):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        archive.writestr("categories.csv", "id,name,type,club_id\n1,Cuotas,income,0\n")
+        archive.writestr("manifest.json", json.dumps({
+            "club_id": club.id, "since": "2026-01-01T00:00:00+00:00", "next_since": "2026-02-01T00:00:00+00:00"
+        }))
+    buffer.seek(0)
+
+    with pytest.raises(ValueError, match="incremental"):
+        restore_club(db, club.id, zipfile.ZipFile(buffer))
+
+
+def test_restore_rejects_archive_without_manifest(db, club):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        archive.writestr("categories.csv", "id,name,type,club_id\n1,Cuotas,income,0\n")
+    buffer.seek(0)
+
+    with pytest.raises(ValueError, match="manifest"):
+        restore_club(db, club.id, zipfile.ZipFile(buffer))
@@ -0,0 +1,20 @@
+import time
+import uuid
+
+from backend import models, security
+
+
+def test_demotion_survives_a_restart(db, club, monkeypatch):
+    user = models.User(email=f"tesorero-{uuid.uuid4().hex[:8]}@example.com", hashed_password="hash", role="admin", club_id=club.id, is_active=True)
+    db.add(user)
+    db.commit()
+    payload = dict(security.access_token_claims(user), iat=int(time.time()) - 5)
+
+    user.role = "socio"
+    security.invalidate_principals(db, user.email)
+    db.commit()
+
+    monkeypatch.setattr(security, "principal_cache", security.PrincipalCache()) # A worker started afterwards
+    principal = security.resolve_principal(payload, db)
+
+    assert principal.role == "socio"
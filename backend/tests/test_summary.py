@@ -0,0 +1,50 @@
+"""The monthly summary kept by the club_transactions triggers matches a rebuild from scratch."""
+from datetime import date
+from decimal import Decimal
+
+from backend import models
+from backend.summary import rebuild_monthly_summary
+
+
+def summary_rows(db, club):
+    rows = db.query(models.ClubMonthlySummary).filter(models.ClubMonthlySummary.club_id == club.id).all()
+    return {
+        (row.month, row.type, row.category_id, row.activity_id, row.payment_method): (row.total_amount, row.transaction_count)
+        for row in rows
+    }
+
+
+def assert_summary_matches_rebuild(db, club):
+    maintained = summary_rows(db, club)
+    rebuild_monthly_summary(db, club.id)
+    db.commit()
+    assert summary_rows(db, club) == maintained
+
+
+def test_summary_triggers_match_the_rebuild(db, club, admin):
+    def transaction(day, amount, payment_method, type=models.CategoryType.INCOME):
+        return models.ClubTransaction(
+            transaction_date=day, description="Movimiento", amount=Decimal(amount), type=type,
+            payment_method=payment_method, club_id=club.id, user_id=admin.id
+        )
+
+    transactions = [
+        transaction(date(2026, 9, 5), "10.00", "efectivo"),
+        transaction(date(2026, 9, 20), "15.50", "efectivo"),
+        transaction(date(2026, 9, 21), "30.00", None),
+        transaction(date(2026, 10, 2), "7.25", "transferencia", models.CategoryType.EXPENSE),
+    ]
+    db.add_all(transactions)
+    db.commit()
+    assert_summary_matches_rebuild(db, club)
+
+    transactions[0].amount = Decimal("12.00")
+    transactions[2].transaction_date = date(2026, 10, 1) # Moves to another month
+    transactions[3].payment_method = "efectivo"
+    db.commit()
+    assert_summary_matches_rebuild(db, club)
+
+    db.delete(transactions[1])
+    db.delete(transactions[3]) # Empties its summary row
+    db.commit()
+    assert_summary_matches_rebuild(db, club)
@@ -0,0 +1,66 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from backend import models
+from backend.sync import SyncCursorExpired, decode_sync_cursor, read_club_delta
+
+
+def test_sync_pages_through_the_club(db, club):
+    db.add_all([models.Activity(name=f"Activity {i}", monthly_cost=Decimal("10.00"), club_id=club.id) for i in range(5)])
+    db.commit()
+
+    pages = [read_club_delta(club.id, page_rows=2)]
+    while pages[-1].has_more:
+        pages.append(read_club_delta(club.id, pages[-1].cursor, page_rows=2))
+
+    assert all(page.full for page in pages)
+    assert all(len(page.activities) <= 2 for page in pages)
+    activity_ids = [activity.id for page in pages for activity in page.activities]
+    assert len(activity_ids) == 5 and len(set(activity_ids)) == 5
+
+
+def test_sync_cursor_older_than_pruned_tombstones_expires(db, club):
+    delta = read_club_delta(club.id)
+    while delta.has_more:
+        delta = read_club_delta(club.id, delta.cursor)
+    since = decode_sync_cursor(delta.cursor, club.id).since
+
+    db.add(models.ClubSyncHorizon(club_id=club.id, pruned_change_seq=since))
+    db.commit()
+
+    with pytest.raises(SyncCursorExpired):
+        read_club_delta(club.id, delta.cursor)
+
+
+def read_whole_delta(club_id, cursor=None):
+    pages = [read_club_delta(club_id, cursor)]
+    while pages[-1].has_more:
+        pages.append(read_club_delta(club_id, pages[-1].cursor))
+    return pages
+
+
+def test_delta_returns_updates_and_deletions_after_the_cursor(db, club, admin):
+    updated = models.Member(first_name="Socio", last_name="Actualizado", phone="555", club_id=club.id, is_active=True)
+    untouched = models.Member(first_name="Socio", last_name="Intacto", phone="555", club_id=club.id, is_active=True)
+    transaction = models.ClubTransaction(
+        transaction_date=date(2026, 10, 1), description="Cuota", amount=Decimal("10.00"), type=models.CategoryType.INCOME,
+        club_id=club.id, user_id=admin.id
+    )
+    db.add_all([updated, untouched, transaction])
+    db.commit()
+    updated_id, untouched_id, transaction_id = updated.id, untouched.id, transaction.id
+    cursor = read_whole_delta(club.id)[-1].cursor
+
+    updated.last_name = "Cambiado"
+    db.commit()
+    db.delete(transaction)
+    db.commit()
+
+    pages = read_whole_delta(club.id, cursor)
+    member_ids = {member.id for page in pages for member in page.members}
+    deleted = {(deletion.entity, deletion.id) for page in pages for deletion in page.deleted}
+    assert not any(page.full for page in pages)
+    assert updated_id in member_ids and untouched_id not in member_ids
+    assert ("transactions", transaction_id) in deleted